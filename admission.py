@@ -0,0 +1,175 @@
+"""Controle de admissão por classe de requisição.
+
+Cada requisição é classificada (interativa, lote ou polling) e só executa se
+houver vaga na sua classe e na capacidade total do worker. A capacidade fica
+abaixo do número de threads (``ADMISSION_THREADS - ADMISSION_RESERVE``): as
+threads de reserva recebem as requisições excedentes, que esperam na fila ou
+são recusadas em vez de ficarem presas no backlog do gunicorn. Classes de maior
+prioridade passam na frente das que estão esperando; polls nunca esperam e só
+entram com a carga total abaixo de ``ADMISSION_POLL_MAX_LOAD``: acima disso
+recebem 503 + Retry-After e o JavaScript espaça as consultas.
+
+Só faz sentido com workers de múltiplas threads (gunicorn ``--threads``).
+"""
+import os
+import time
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict
+
+from flask import g, jsonify, make_response, request
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestClass:
+    name: str
+    priority: int  # menor = mais prioritária
+    limit: int
+    queue_timeout: float
+    max_load: int  # só executa com menos que isso de requisições ativas no total
+
+
+ADMISSION_DEFAULTS = {
+    "ADMISSION_THREADS": "8",  # igual ao --threads do gunicorn (Procfile/render.yaml)
+    "ADMISSION_RESERVE": "2",
+    "ADMISSION_BATCH_LIMIT": "2",
+    "ADMISSION_POLL_MAX_LOAD": "4",
+    "ADMISSION_QUEUE_TIMEOUT": "10",
+    "ADMISSION_RETRY_AFTER": "15",
+}
+
+# Consultas periódicas feitas pelo JavaScript (também marcadas com o cabeçalho X-Poll)
+POLL_ENDPOINTS = {
+    "whatsapp_status", "whatsapp_rate_limits", "get_whatsapp_contacts", "get_whatsapp_chats", "api_kanban_cards",
+}
+# Operações pesadas iniciadas pelo usuário
+BATCH_ENDPOINTS = {"bulk_clients", "funnel_analytics", "archive_search", "scan_duplicates"}
+# Nunca limitadas (arquivos estáticos)
+EXEMPT_ENDPOINTS = {"static", "hashed_asset"}
+
+
+def classify(req) -> str:
+    if req.endpoint in EXEMPT_ENDPOINTS:
+        return "exempt"
+    if req.headers.get("X-Poll") == "1" or req.endpoint in POLL_ENDPOINTS:
+        return "poll"
+    if req.endpoint in BATCH_ENDPOINTS:
+        return "batch"
+    return "interactive"
+
+
+class AdmissionController:
+    """Vagas por classe + capacidade total, com fila por prioridade"""
+
+    def __init__(self):
+        self.classes: Dict[str, RequestClass] = {}
+        self.max_concurrent = int(ADMISSION_DEFAULTS["ADMISSION_THREADS"]) - int(ADMISSION_DEFAULTS["ADMISSION_RESERVE"])
+        self.retry_after = int(ADMISSION_DEFAULTS["ADMISSION_RETRY_AFTER"])
+        self.active = Counter()
+        self.waiting = Counter()
+        self.counters = Counter()
+        self._cond = threading.Condition()
+
+    def init_app(self, app):
+        for name, default in ADMISSION_DEFAULTS.items():
+            app.config.setdefault(name, int(os.environ.get(name, default)))
+        threads = app.config["ADMISSION_THREADS"]
+        app.config.setdefault(
+            "ADMISSION_MAX_CONCURRENT",
+            int(os.environ.get("ADMISSION_MAX_CONCURRENT", threads - app.config["ADMISSION_RESERVE"]))
+        )
+        self.max_concurrent = app.config["ADMISSION_MAX_CONCURRENT"]
+        if not 0 < self.max_concurrent < threads:
+            raise ValueError("ADMISSION_MAX_CONCURRENT deve ficar entre 1 e ADMISSION_THREADS - 1")
+        self.retry_after = app.config["ADMISSION_RETRY_AFTER"]
+        queue_timeout = app.config["ADMISSION_QUEUE_TIMEOUT"]
+        max_concurrent = self.max_concurrent
+        self.classes = {
+            "interactive": RequestClass("interactive", 0, max_concurrent, queue_timeout, max_concurrent),
+            "batch": RequestClass("batch", 1, app.config["ADMISSION_BATCH_LIMIT"], queue_timeout / 2, max_concurrent),
+            "poll": RequestClass("poll", 2, max_concurrent, 0,
+                                 min(app.config["ADMISSION_POLL_MAX_LOAD"], max_concurrent)),
+        }
+
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def _can_run(self, spec: RequestClass) -> bool:
+        if self.active[spec.name] >= spec.limit or sum(self.active.values()) >= spec.max_load:
+            return False
+        # Classes mais prioritárias esperando passam na frente
+        return not any(
+            self.waiting[other.name] for other in self.classes.values() if other.priority < spec.priority
+        )
+
+    def acquire(self, name: str) -> bool:
+        spec = self.classes[name]
+        deadline = time.monotonic() + spec.queue_timeout
+        with self._cond:
+            self.waiting[name] += 1
+            try:
+                while not self._can_run(spec):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters[f"shed_{name}"] += 1
+                        return False
+                    self._cond.wait(remaining)
+                self.active[name] += 1
+                self.counters[f"admitted_{name}"] += 1
+                return True
+            finally:
+                self.waiting[name] -= 1
+                # Uma desistência pode liberar classes de menor prioridade
+                self._cond.notify_all()
+
+    def release(self, name: str) -> None:
+        with self._cond:
+            self.active[name] -= 1
+            self._cond.notify_all()
+
+    def _before_request(self):
+        name = classify(request)
+        if name not in self.classes:
+            return None
+        if not self.acquire(name):
+            logger.warning(f"Requisição {name} recusada por saturação: {request.method} {request.path}")
+            return self._overloaded(name)
+        g._admission_class = name
+        return None
+
+    def _teardown_request(self, exc):
+        name = g.pop("_admission_class", None)
+        if name is not None:
+            self.release(name)
+
+    def _overloaded(self, name):
+        message = "Servidor ocupado. Tente novamente em instantes."
+        wants_json = (
+            name == "poll" or request.is_json
+            or request.headers.get("X-Requested-With") == "XMLHttpRequest"
+        )
+        if wants_json:
+            response = jsonify({"error": message, "retry_after": self.retry_after})
+        else:
+            response = make_response(message)
+        response.status_code = 503
+        response.headers["Retry-After"] = str(self.retry_after)
+        return response
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "active": dict(self.active),
+                "waiting": dict(self.waiting),
+                "counters": dict(self.counters),
+                "limits": {name: spec.limit for name, spec in self.classes.items()},
+                "max_load": {name: spec.max_load for name, spec in self.classes.items()},
+            }
+
+
+admission = AdmissionController()
@@ -0,0 +1,174 @@
+"""Funil de vendas: log de transições do Kanban e agregados diários.
+
+Cada movimentação de coluna grava uma linha em ``card_transitions`` (um INSERT
+na mesma transação da view). A tarefa ``funnel_rollup`` resume o log em
+``funnel_daily_stats`` por dia, coluna e tipo de seguro; as páginas de análise
+leem só essa tabela pequena, nunca o histórico bruto.
+"""
+import os
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+
+from app import db
+from database import serialized_section
+from models import CardTransition, Client, FunnelDailyStat, KanbanColumn
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_CHUNK_DAYS = 31
+WON_COLUMN = os.environ.get("ANALYTICS_WON_COLUMN", "Vendas Concluídas")
+
+# ==================== LOG DE TRANSIÇÕES ====================
+
+def record_transition(card, from_column_id: Optional[int], user_id: Optional[int] = None) -> None:
+    """Registra a entrada do cartão na coluna atual (não faz commit).
+
+    O tipo de seguro vem de uma subconsulta no próprio INSERT, sem carregar o cliente.
+    """
+    transition = CardTransition()
+    transition.card_id = card.id
+    transition.from_column_id = from_column_id
+    transition.to_column_id = card.column_id
+    transition.insurance_type = (
+        select(Client.insurance_type).where(Client.id == card.client_id).scalar_subquery()
+        if card.client_id else None
+    )
+    transition.user_id = user_id
+    db.session.add(transition)
+
+# ==================== ROLLUP DIÁRIO ====================
+
+def _aggregate(start: date, end: date) -> List[Dict]:
+    """Agrega as transições de [start, end) por dia, coluna e tipo de seguro"""
+    start_at, end_at = datetime.combine(start, time.min), datetime.combine(end, time.min)
+    in_window = (CardTransition.created_at >= start_at, CardTransition.created_at < end_at)
+
+    # LAG sobre o histórico do cartão: quando ele entrou na coluna de onde está saindo
+    history = (
+        select(
+            CardTransition.created_at,
+            CardTransition.from_column_id,
+            CardTransition.to_column_id,
+            CardTransition.insurance_type,
+            func.lag(CardTransition.created_at, type_=db.DateTime).over(
+                partition_by=CardTransition.card_id,
+                order_by=(CardTransition.created_at, CardTransition.id)
+            ).label("entered_at"),
+        )
+        .where(CardTransition.card_id.in_(select(CardTransition.card_id).where(*in_window)))
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(history).where(history.c.created_at >= start_at, history.c.created_at < end_at),
+        execution_options={"yield_per": 1000}
+    )
+
+    stats = defaultdict(lambda: {"created": 0, "entries": 0, "exits": 0, "dwell_seconds": 0.0})
+    for created_at, from_column_id, to_column_id, insurance_type, entered_at in rows:
+        day, insurance_type = created_at.date(), insurance_type or ""
+        entry = stats[(day, to_column_id, insurance_type)]
+        entry["entries"] += 1
+        if from_column_id is None:
+            entry["created"] += 1
+        else:
+            exit_ = stats[(day, from_column_id, insurance_type)]
+            exit_["exits"] += 1
+            if entered_at:
+                exit_["dwell_seconds"] += (created_at - entered_at).total_seconds()
+
+    return [
+        {"day": day, "column_id": column_id, "insurance_type": insurance_type, **values}
+        for (day, column_id, insurance_type), values in stats.items()
+    ]
+
+
+def rollup() -> int:
+    """Recalcula os agregados do último dia consolidado até hoje, em blocos de dias"""
+    today = datetime.utcnow().date()
+    start = db.session.scalar(select(func.max(FunnelDailyStat.day)))
+    if start is None:
+        first = db.session.scalar(select(func.min(CardTransition.created_at)))
+        if first is None:
+            return 0
+        start = first.date()
+    db.session.rollback()
+
+    total = 0
+    while start <= today:
+        end = min(start + timedelta(days=ROLLUP_CHUNK_DAYS), today + timedelta(days=1))
+        rows = _aggregate(start, end)
+        db.session.rollback()
+        with serialized_section():
+            db.session.execute(delete(FunnelDailyStat).where(
+                FunnelDailyStat.day >= start, FunnelDailyStat.day < end
+            ))
+            if rows:
+                db.session.execute(insert(FunnelDailyStat), rows)
+            db.session.commit()
+        total += len(rows)
+        start = end
+    logger.info(f"Funil consolidado: {total} agregados diários recalculados")
+    return total
+
+# ==================== RELATÓRIOS ====================
+
+def funnel_report(days: Optional[int] = None) -> Dict:
+    """Funil por coluna e conversão por tipo de seguro, lidos dos agregados"""
+    filters = []
+    if days:
+        filters.append(FunnelDailyStat.day >= datetime.utcnow().date() - timedelta(days=days - 1))
+
+    columns = KanbanColumn.query.filter_by(active=True).order_by(KanbanColumn.order_position).all()
+    by_column = {
+        column_id: (created, entries, exits, dwell)
+        for column_id, created, entries, exits, dwell in db.session.execute(
+            select(
+                FunnelDailyStat.column_id,
+                func.sum(FunnelDailyStat.created),
+                func.sum(FunnelDailyStat.entries),
+                func.sum(FunnelDailyStat.exits),
+                func.sum(FunnelDailyStat.dwell_seconds),
+            ).where(*filters).group_by(FunnelDailyStat.column_id)
+        )
+    }
+    stages = []
+    for column in columns:
+        created, entries, exits, dwell = by_column.get(column.id, (0, 0, 0, 0))
+        stages.append({
+            "name": column.name,
+            "color": column.color,
+            "created": created or 0,
+            "entries": entries or 0,
+            "exits": exits or 0,
+            "avg_days": round(dwell / exits / 86400, 1) if exits else None,
+        })
+
+    won_column = next((column for column in columns if column.name == WON_COLUMN), None)
+    conversion = []
+    for insurance_type, created, won in db.session.execute(
+        select(
+            FunnelDailyStat.insurance_type,
+            func.sum(FunnelDailyStat.created),
+            func.sum(db.case(
+                (FunnelDailyStat.column_id == (won_column.id if won_column else -1), FunnelDailyStat.entries),
+                else_=0
+            )),
+        ).where(*filters).group_by(FunnelDailyStat.insurance_type).order_by(FunnelDailyStat.insurance_type)
+    ):
+        conversion.append({
+            "insurance_type": insurance_type or None,
+            "created": created or 0,
+            "won": won or 0,
+            "rate": round(100.0 * won / created, 1) if created else None,
+        })
+
+    return {
+        "stages": stages,
+        "conversion": conversion,
+        "won_column": won_column.name if won_column else None,
+        "last_day": db.session.scalar(select(func.max(FunnelDailyStat.day))),
+    }
@@ -6,13 +6,24 @@ from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from assets import init_assets
+from admission import admission
+from query_budget import init_query_counter
+from versioning import init_versioning
+from scheduler import scheduler
+from cache import cache
+from database import (
+    sqlite_engine_options, configure_sqlite, is_sqlite, ensure_indexes,
+    postgres_engine_options, configure_replica, RoutingSession,
+)
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 login_manager = LoginManager()
 
 def create_app():
@@ -24,13 +35,14 @@ def create_app():
     database_url = os.environ.get("DATABASE_URL")
     if database_url:
         app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-            "pool_recycle": 300,
-            "pool_pre_ping": True,
-        }
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = postgres_engine_options(app)
+        configure_replica(app, os.environ.get("DATABASE_REPLICA_URL"), app.config["SQLALCHEMY_ENGINE_OPTIONS"])
     else:
         app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///instance/monteiro_lite.db"
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_engine_options(app)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Uploads acima disso são recusados com 413 antes de chegar às views (+1 MB para os campos do form)
+    app.config["MAX_CONTENT_LENGTH"] = (int(os.environ.get("WHATSAPP_MAX_FILE_MB", 16)) + 1) * 1024 * 1024
     
     # Initialize extensions
     db.init_app(app)
@@ -38,11 +50,24 @@ def create_app():
     login_manager.login_view = 'login'  # type: ignore
     login_manager.login_message = 'Por favor, faça login para acessar esta página.'
     login_manager.login_message_category = 'info'
+    init_assets(app)
+    admission.init_app(app)
+    init_query_counter(app)
     
     with app.app_context():
+        if is_sqlite(app):
+            configure_sqlite(app, db.engine)
+        
         # Import models to ensure tables are created
         import models
         db.create_all()
+        ensure_indexes(db)
+        init_versioning(db)
+        cache.init_app(app)
+        
+        # Register periodic jobs (the thread is started by the server entry points)
+        import jobs
+        scheduler.init_app(app)
         
         # Create default admin user if it doesn't exist
         from models import User
@@ -0,0 +1,132 @@
+"""Retenção: move cartões encerrados antigos e clientes inativos para tabelas de arquivo.
+
+Roda em lotes pequenos, cada um em sua própria transação (INSERT ... SELECT
+seguido de DELETE), fora do caminho das requisições. Assim as tabelas
+"quentes" e o Kanban ficam limitados ao que está em andamento, e o arquivo
+continua pesquisável.
+
+As tabelas de arquivo têm chave própria e guardam o id original em
+``original_id``, já que o banco pode reutilizar ids de linhas apagadas.
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Dict
+
+from flask import current_app
+from sqlalchemy import and_, delete, exists, insert, literal, or_, select
+
+from database import write_transaction
+from models import (
+    ArchivedClient, ArchivedKanbanCard, Client, ClientDedupeKey, DuplicateCandidate,
+    FollowUpMessage, KanbanCard, KanbanColumn
+)
+from versioning import bump_versions
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DEFAULTS = {
+    "ARCHIVE_CARD_AGE_DAYS": "90",
+    "ARCHIVE_CLIENT_AGE_DAYS": "365",
+    "ARCHIVE_COLUMNS": "Vendas Concluídas,Pós-venda",
+    "ARCHIVE_BATCH_SIZE": "500",
+}
+
+
+def _setting(name):
+    return current_app.config.get(name, os.environ.get(name, ARCHIVE_DEFAULTS[name]))
+
+
+def _closed_column_ids(conn):
+    names = [name.strip() for name in _setting("ARCHIVE_COLUMNS").split(",") if name.strip()]
+    return conn.execute(select(KanbanColumn.id).where(KanbanColumn.name.in_(names))).scalars().all()
+
+
+def archive_cards() -> int:
+    """Arquiva cartões das colunas de encerramento criados há mais de ARCHIVE_CARD_AGE_DAYS dias"""
+    cutoff = datetime.utcnow() - timedelta(days=int(_setting("ARCHIVE_CARD_AGE_DAYS")))
+    batch_size = int(_setting("ARCHIVE_BATCH_SIZE"))
+    total = 0
+    while True:
+        with write_transaction() as conn:
+            column_ids = _closed_column_ids(conn)
+            if not column_ids:
+                break
+            ids = conn.execute(
+                select(KanbanCard.id)
+                .where(KanbanCard.column_id.in_(column_ids), KanbanCard.created_at < cutoff)
+                .order_by(KanbanCard.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+
+            source = (
+                select(
+                    KanbanCard.id, KanbanCard.title, KanbanCard.description, KanbanCard.client_id,
+                    Client.name, KanbanColumn.name, KanbanCard.priority, KanbanCard.created_at,
+                    literal(datetime.utcnow()),
+                )
+                .join(KanbanColumn, KanbanColumn.id == KanbanCard.column_id)
+                .outerjoin(Client, Client.id == KanbanCard.client_id)
+                .where(KanbanCard.id.in_(ids))
+            )
+            conn.execute(insert(ArchivedKanbanCard).from_select([
+                "original_id", "title", "description", "client_id", "client_name",
+                "column_name", "priority", "created_at", "archived_at",
+            ], source))
+            conn.execute(delete(KanbanCard).where(KanbanCard.id.in_(ids)))
+            bump_versions("kanban_cards", connection=conn)
+        total += len(ids)
+    return total
+
+
+def archive_clients() -> int:
+    """Arquiva clientes inativos antigos sem cartões no Kanban nem follow-ups pendentes.
+
+    O histórico de follow-ups já enviados e os pares de duplicados desses clientes são removidos.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=int(_setting("ARCHIVE_CLIENT_AGE_DAYS")))
+    batch_size = int(_setting("ARCHIVE_BATCH_SIZE"))
+    total = 0
+    while True:
+        with write_transaction() as conn:
+            ids = conn.execute(
+                select(Client.id)
+                .where(
+                    Client.status == "inativo",
+                    Client.created_at < cutoff,
+                    ~exists().where(KanbanCard.client_id == Client.id),
+                    ~exists().where(and_(
+                        FollowUpMessage.client_id == Client.id, FollowUpMessage.status == "pendente"
+                    )),
+                )
+                .order_by(Client.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+
+            source = select(
+                Client.id, Client.name, Client.email, Client.phone, Client.insurance_type,
+                Client.notes, Client.status, Client.created_at, literal(datetime.utcnow()),
+            ).where(Client.id.in_(ids))
+            conn.execute(insert(ArchivedClient).from_select([
+                "original_id", "name", "email", "phone", "insurance_type",
+                "notes", "status", "created_at", "archived_at",
+            ], source))
+            conn.execute(delete(FollowUpMessage).where(FollowUpMessage.client_id.in_(ids)))
+            conn.execute(delete(ClientDedupeKey).where(ClientDedupeKey.client_id.in_(ids)))
+            conn.execute(delete(DuplicateCandidate).where(or_(
+                DuplicateCandidate.client_id.in_(ids), DuplicateCandidate.duplicate_id.in_(ids)
+            )))
+            conn.execute(delete(Client).where(Client.id.in_(ids)))
+            bump_versions("clients", connection=conn)
+        total += len(ids)
+    return total
+
+
+def run_retention() -> Dict[str, int]:
+    """Cartões primeiro: clientes só são arquivados quando não têm mais cartões ativos"""
+    result = {"cards": archive_cards(), "clients": archive_clients()}
+    if any(result.values()):
+        logger.info(f"Retenção: {result['cards']} cartões e {result['clients']} clientes arquivados")
+    return result
@@ -0,0 +1,151 @@
+"""Pipeline de assets estáticos: minificação, hash de conteúdo e pré-compressão.
+
+Uso no build (render.yaml): ``python assets.py``. Gera ``static/dist`` com os
+arquivos versionados, variantes ``.gz``/``.br`` e um ``manifest.json``.
+"""
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+import mimetypes
+
+from flask import abort, request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele só geramos .gz
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ASSETS = [
+    "css/style.css",
+    "js/kanban.js",
+    "js/whatsapp.js",
+]
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# ==================== MINIFICAÇÃO ====================
+
+def minify_css(source: str) -> str:
+    """Remove comentários e espaços desnecessários do CSS"""
+    source = re.sub(r"/\*.*?\*/", "", source, flags=re.S)
+    source = re.sub(r"\s+", " ", source)
+    source = re.sub(r"\s*([{};:,>])\s*", r"\1", source)
+    return source.replace(";}", "}").strip()
+
+
+def minify_js(source: str) -> str:
+    """Minificação conservadora do JS: remove indentação, linhas vazias e comentários de linha inteira.
+
+    As quebras de linha são mantidas para não depender de inserção automática de ponto e vírgula.
+    """
+    lines = []
+    for line in source.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("//"):
+            continue
+        lines.append(stripped)
+    return "\n".join(lines) + "\n"
+
+
+MINIFIERS = {
+    ".css": minify_css,
+    ".js": minify_js,
+}
+
+# ==================== BUILD ====================
+
+def _hashed_name(path: str, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    base, ext = os.path.splitext(path)
+    return f"{base}.{digest}{ext}"
+
+
+def build(static_folder: str) -> dict:
+    """Gera os assets versionados e pré-comprimidos e retorna o manifest"""
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+
+    for asset in ASSETS:
+        with open(os.path.join(static_folder, asset), encoding="utf-8") as f:
+            source = f.read()
+
+        minify = MINIFIERS.get(os.path.splitext(asset)[1])
+        content = (minify(source) if minify else source).encode("utf-8")
+        hashed = _hashed_name(asset, content)
+        target = os.path.join(dist_folder, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        with open(target, "wb") as f:
+            f.write(content)
+        with open(target + ".gz", "wb") as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(target + ".br", "wb") as f:
+                f.write(brotli.compress(content, quality=11))
+
+        manifest[asset] = hashed
+        logger.info(f"Asset gerado: {asset} -> {hashed} ({len(source)} -> {len(content)} bytes)")
+
+    with open(os.path.join(dist_folder, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+
+def load_manifest(static_folder: str) -> dict:
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# ==================== INTEGRAÇÃO COM O FLASK ====================
+
+def init_assets(app):
+    """Registra o helper ``asset_url`` e a rota dos assets versionados"""
+    dist_folder = os.path.join(app.static_folder, DIST_DIR)
+    manifest = load_manifest(app.static_folder)
+    if not manifest:
+        logger.warning("Manifest de assets não encontrado; servindo arquivos originais (rode `python assets.py`)")
+
+    def asset_url(filename):
+        """Resolve o nome versionado do asset, com fallback para o arquivo original"""
+        hashed = manifest.get(filename)
+        if hashed is None:
+            return url_for("static", filename=filename)
+        return url_for("hashed_asset", filename=hashed)
+
+    @app.route("/assets/<path:filename>")
+    def hashed_asset(filename):
+        path = os.path.realpath(os.path.join(dist_folder, filename))
+        if not path.startswith(os.path.realpath(dist_folder) + os.sep) or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        encoding = None
+        for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if candidate in request.accept_encodings and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, candidate
+                break
+
+        response = send_file(path, mimetype=mimetype, max_age=CACHE_MAX_AGE, conditional=True)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.jinja_env.globals["asset_url"] = asset_url
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    build(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
@@ -0,0 +1,143 @@
+"""Operações em massa sobre clientes.
+
+Cada operação recebe uma lista de ids ou os mesmos filtros da listagem de
+clientes e roda em blocos (paginação por id), cada bloco com um único
+UPDATE / INSERT ... SELECT / DELETE na sua própria transação curta. O
+resultado traz o progresso (blocos e linhas afetadas).
+"""
+import os
+import time
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, exists, func, insert, literal, null, or_, select, update
+
+from database import write_transaction
+from models import CardTransition, Client, ClientDedupeKey, DuplicateCandidate, FollowUpMessage, KanbanCard
+from versioning import bump_versions
+
+logger = logging.getLogger(__name__)
+
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", 1000))
+CLIENT_STATUSES = ("prospect", "ativo", "inativo")
+
+
+def client_filters(ids=None, search=None, status=None, insurance_type=None) -> List:
+    """Condições WHERE equivalentes aos filtros da listagem de clientes"""
+    filters = []
+    if ids is not None:
+        filters.append(Client.id.in_(ids))
+    if search:
+        filters.append(or_(
+            Client.name.ilike(f'%{search}%'),
+            Client.email.ilike(f'%{search}%'),
+            Client.phone.ilike(f'%{search}%')
+        ))
+    if status:
+        filters.append(Client.status == status)
+    if insurance_type:
+        filters.append(Client.insurance_type == insurance_type)
+    return filters
+
+
+def _run_chunked(action: str, filters: List, operation: Callable, chunk_size: int = BULK_CHUNK_SIZE) -> Dict:
+    """Percorre os clientes filtrados em blocos por id; ``operation(conn, ids)`` retorna as linhas afetadas"""
+    from app import db
+
+    started = time.monotonic()
+    matched = db.session.scalar(select(func.count(Client.id)).where(*filters))
+    db.session.rollback()
+
+    affected, chunks, last_id = 0, 0, 0
+    while True:
+        with write_transaction() as conn:
+            ids = conn.execute(
+                select(Client.id).where(*filters, Client.id > last_id).order_by(Client.id).limit(chunk_size)
+            ).scalars().all()
+            if not ids:
+                break
+            affected += operation(conn, ids)
+        chunks += 1
+        last_id = ids[-1]
+        logger.info(f"Operação em massa {action}: bloco {chunks}, {affected} de {matched} processados")
+
+    return {
+        "action": action,
+        "matched": matched,
+        "affected": affected,
+        "chunks": chunks,
+        "elapsed_ms": int((time.monotonic() - started) * 1000),
+    }
+
+
+def set_status(filters: List, status: str) -> Dict:
+    """UPDATE clients SET status em blocos"""
+    def operation(conn, ids):
+        result = conn.execute(
+            update(Client).where(Client.id.in_(ids), Client.status != status).values(status=status)
+        )
+        bump_versions("clients", connection=conn)
+        return result.rowcount
+
+    return _run_chunked("status", filters, operation)
+
+
+def create_cards(filters: List, column_id: int, priority: str = "normal",
+                 title_prefix: Optional[str] = None, user_id: Optional[int] = None) -> Dict:
+    """INSERT ... SELECT de um cartão por cliente na coluna (ignora quem já tem cartão nela)"""
+    title = Client.name
+    if title_prefix:
+        title = literal(f"{title_prefix[:90]} - ") + Client.name
+
+    def operation(conn, ids):
+        now = datetime.utcnow()
+        max_position = conn.execute(
+            select(func.coalesce(func.max(KanbanCard.order_position), 0)).where(KanbanCard.column_id == column_id)
+        ).scalar()
+        source = select(
+            title,
+            Client.id,
+            literal(column_id),
+            literal(priority),
+            literal(max_position) + func.row_number().over(order_by=Client.id),
+            literal(now),
+        ).where(
+            Client.id.in_(ids),
+            ~exists().where(KanbanCard.client_id == Client.id, KanbanCard.column_id == column_id),
+        )
+        card_ids = conn.execute(insert(KanbanCard).from_select(
+            ["title", "client_id", "column_id", "priority", "order_position", "created_at"], source
+        ).returning(KanbanCard.id)).scalars().all()
+        if not card_ids:
+            return 0
+
+        # Log do funil só para os cartões inseridos por esta chamada
+        conn.execute(insert(CardTransition).from_select(
+            ["card_id", "from_column_id", "to_column_id", "insurance_type", "user_id", "created_at"],
+            select(
+                KanbanCard.id, null(), KanbanCard.column_id, Client.insurance_type, literal(user_id), literal(now)
+            )
+            .join(Client, Client.id == KanbanCard.client_id)
+            .where(KanbanCard.id.in_(card_ids))
+        ))
+        bump_versions("kanban_cards", connection=conn)
+        return len(card_ids)
+
+    return _run_chunked("kanban", filters, operation)
+
+
+def delete_clients(filters: List) -> Dict:
+    """Remove os clientes; cartões do Kanban ficam sem cliente e os dados auxiliares são apagados"""
+    def operation(conn, ids):
+        conn.execute(update(KanbanCard).where(KanbanCard.client_id.in_(ids)).values(client_id=None))
+        conn.execute(delete(FollowUpMessage).where(FollowUpMessage.client_id.in_(ids)))
+        conn.execute(delete(ClientDedupeKey).where(ClientDedupeKey.client_id.in_(ids)))
+        conn.execute(delete(DuplicateCandidate).where(or_(
+            DuplicateCandidate.client_id.in_(ids), DuplicateCandidate.duplicate_id.in_(ids)
+        )))
+        result = conn.execute(delete(Client).where(Client.id.in_(ids)))
+        bump_versions("clients", "kanban_cards", connection=conn)
+        return result.rowcount
+
+    return _run_chunked("delete", filters, operation)
@@ -0,0 +1,287 @@
+"""Cache em dois níveis compartilhado entre os workers.
+
+- Nível local: LRU em memória do processo (mais rápido, por worker).
+- Nível compartilhado: tabela ``cache_entries`` no banco (padrão com Postgres) ou
+  um servidor que fale o protocolo Redis (``CACHE_BACKEND=redis``, ``CACHE_URL``).
+  No SQLite o padrão é só o nível local: gravar no arquivo disputaria o lock de
+  escrita da aplicação. Leituras de vida curta (ex.: WPPConnect) usam
+  ``local_only=True`` e nunca vão ao nível compartilhado.
+
+Invalidação: entradas declaradas com ``depends_on`` incluem na chave os
+carimbos de ``data_versions`` das tabelas. Qualquer escrita (em qualquer worker)
+incrementa o carimbo pelos hooks de ``versioning``, e todos os workers passam a
+procurar uma chave nova; as entradas antigas expiram pelo TTL ou saem do LRU.
+
+Os valores devem ser serializáveis em JSON.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from flask import has_app_context
+from sqlalchemy import delete, select
+
+from database import is_sqlite
+from versioning import get_versions
+
+try:
+    import redis
+except ImportError:  # redis é opcional: sem ele o nível compartilhado usa o banco
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+CACHE_DEFAULTS = {
+    "CACHE_BACKEND": "",  # db, redis ou memory (sem nível compartilhado); vazio = memory no SQLite, db nos demais
+    "CACHE_URL": "redis://localhost:6379/0",
+    "CACHE_DEFAULT_TTL": "300",
+    "CACHE_LOCAL_MAX_ENTRIES": "1024",
+}
+
+
+class LRUCache:
+    """LRU com expiração por entrada, seguro entre threads"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= now:
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# ==================== NÍVEIS COMPARTILHADOS ====================
+
+class DatabaseCacheBackend:
+    """Entradas na tabela cache_entries (valor em JSON, expiração em time.time()).
+
+    As escritas usam uma transação própria sem o lock de escrita da aplicação: uma
+    falha (ex.: banco ocupado) só vira um erro de cache contado e registrado.
+    """
+
+    name = "db"
+
+    def get(self, key: str):
+        """Retorna (valor, segundos restantes) ou (_MISSING, 0)"""
+        from app import db
+        from models import CacheEntry
+
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                select(CacheEntry.value, CacheEntry.expires_at).where(CacheEntry.key == key)
+            ).first()
+        remaining = row.expires_at - time.time() if row else 0
+        if remaining <= 0:
+            return _MISSING, 0
+        return json.loads(row.value), remaining
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        from models import CacheEntry
+
+        from app import db
+
+        table = CacheEntry.__table__
+        values = {"value": json.dumps(value, default=str), "expires_at": time.time() + ttl}
+        with db.engine.begin() as conn:
+            updated = conn.execute(table.update().where(table.c.key == key).values(**values))
+            if updated.rowcount == 0:
+                conn.execute(table.insert().values(key=key, **values))
+
+    def delete(self, key: str) -> None:
+        from app import db
+        from models import CacheEntry
+
+        with db.engine.begin() as conn:
+            conn.execute(delete(CacheEntry).where(CacheEntry.key == key))
+
+    def purge_expired(self) -> int:
+        from app import db
+        from models import CacheEntry
+
+        with db.engine.begin() as conn:
+            return conn.execute(delete(CacheEntry).where(CacheEntry.expires_at <= time.time())).rowcount
+
+
+class RedisCacheBackend:
+    """Servidor compatível com o protocolo Redis (Redis, KeyDB, Valkey...)"""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def get(self, key: str):
+        raw, remaining_ms = self.client.pipeline().get(key).pttl(key).execute()
+        if raw is None:
+            return _MISSING, 0
+        return json.loads(raw), (remaining_ms / 1000 if remaining_ms and remaining_ms > 0 else 1)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.client.set(key, json.dumps(value, default=str), ex=max(1, int(ttl)))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+    def purge_expired(self) -> int:
+        return 0  # o servidor expira as chaves sozinho
+
+# ==================== CACHE ====================
+
+class Cache:
+    """Fachada do cache: LRU local + nível compartilhado + invalidação por carimbos de versão"""
+
+    def __init__(self):
+        self.app = None
+        self.local = LRUCache(int(CACHE_DEFAULTS["CACHE_LOCAL_MAX_ENTRIES"]))
+        self.shared = None
+        self.default_ttl = int(CACHE_DEFAULTS["CACHE_DEFAULT_TTL"])
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        for name, default in CACHE_DEFAULTS.items():
+            app.config.setdefault(name, os.environ.get(name, default))
+        self.app = app
+        self.default_ttl = int(app.config["CACHE_DEFAULT_TTL"])
+        self.local = LRUCache(int(app.config["CACHE_LOCAL_MAX_ENTRIES"]))
+
+        backend = app.config["CACHE_BACKEND"] or ("memory" if is_sqlite(app) else "db")
+        if backend == "redis" and redis is None:
+            logger.warning("CACHE_BACKEND=redis sem o pacote redis instalado; usando o banco como nível compartilhado")
+            backend = "db"
+        if backend == "redis":
+            self.shared = RedisCacheBackend(app.config["CACHE_URL"])
+        elif backend == "db":
+            self.shared = DatabaseCacheBackend()
+        else:
+            self.shared = None
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _shared(self):
+        # O nível compartilhado do banco precisa de contexto de aplicação
+        if self.shared is None or (isinstance(self.shared, DatabaseCacheBackend) and not has_app_context()):
+            return None
+        return self.shared
+
+    def versioned_key(self, key: str, depends_on: Iterable[str]) -> str:
+        """Anexa à chave os carimbos de versão das tabelas (uma consulta por chave composta)"""
+        depends_on = tuple(depends_on)
+        if not depends_on:
+            return key
+        versions = get_versions(*depends_on)
+        stamp = ",".join(f"{name}:{versions.get(name, (0, None))[0]}" for name in depends_on)
+        return f"{key}@{stamp}"
+
+    def get(self, key: str, default: Any = None, local_only: bool = False) -> Any:
+        value = self.local.get(key)
+        if value is not _MISSING:
+            self._count("local_hits")
+            return value
+
+        shared = None if local_only else self._shared()
+        if shared is not None:
+            try:
+                value, remaining = shared.get(key)
+            except Exception as e:
+                self._count("errors")
+                logger.warning(f"Falha ao ler do cache compartilhado: {e}")
+                value = _MISSING
+            if value is not _MISSING:
+                self._count("shared_hits")
+                # Promove ao nível local só pelo tempo que resta no compartilhado
+                self.local.set(key, value, remaining)
+                return value
+
+        self._count("misses")
+        return default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, local_only: bool = False) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        self.local.set(key, value, ttl)
+        self._count("sets")
+        shared = None if local_only else self._shared()
+        if shared is not None:
+            try:
+                shared.set(key, value, ttl)
+            except Exception as e:
+                self._count("errors")
+                logger.warning(f"Falha ao gravar no cache compartilhado: {e}")
+
+    def delete(self, *keys: str, local_only: bool = False) -> None:
+        shared = None if local_only else self._shared()
+        for key in keys:
+            self.local.delete(key)
+            if shared is not None:
+                try:
+                    shared.delete(key)
+                except Exception as e:
+                    self._count("errors")
+                    logger.warning(f"Falha ao remover do cache compartilhado: {e}")
+
+    def get_or_set(self, key: str, loader: Callable[[], Any], ttl: Optional[float] = None,
+                   depends_on: Iterable[str] = ()) -> Any:
+        """Valor em cache ou resultado de ``loader()``; ``depends_on`` invalida pelas versões das tabelas"""
+        key = self.versioned_key(key, depends_on)
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def purge_expired(self) -> int:
+        shared = self._shared()
+        return shared.purge_expired() if shared is not None else 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters.get("local_hits", 0) + counters.get("shared_hits", 0) + counters.get("misses", 0)
+        hits = lookups - counters.get("misses", 0)
+        return {
+            "backend": self.shared.name if self.shared else "memory",
+            "counters": counters,
+            "evictions": self.local.evictions,
+            "local_entries": len(self.local),
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+        }
+
+
+cache = Cache()
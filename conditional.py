@@ -0,0 +1,72 @@
+"""GET condicional (ETag / Last-Modified / 304) para os endpoints JSON consultados por polling."""
+import json
+import hashlib
+from functools import wraps
+
+from flask import jsonify, make_response, request
+
+from versioning import get_versions
+
+
+def _digest(value) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+def _apply_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # O navegador guarda a resposta mas sempre revalida: polls sem mudança viram 304
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
+
+
+def _not_modified(etag, last_modified=None):
+    response = make_response("", 304)
+    return _apply_validators(response, etag, last_modified)
+
+
+def versioned(*tables):
+    """ETag calculada a partir dos carimbos de versão das tabelas usadas pela view.
+
+    Se o cliente já tem a versão atual, responde 304 sem executar a view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = get_versions(*tables)
+            stamp = ";".join(f"{name}:{versions.get(name, (0, None))[0]}" for name in tables)
+            etag = _digest(f"{request.full_path}|{stamp}")
+            timestamps = [updated_at for _, updated_at in versions.values() if updated_at]
+            last_modified = max(timestamps) if timestamps else None
+
+            if request.if_none_match.contains(etag):
+                return _not_modified(etag, last_modified)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _apply_validators(response, etag, last_modified)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def conditional_json(payload, etag_data=None, status=200):
+    """Resposta JSON com ETag pelo conteúdo.
+
+    ``etag_data`` permite excluir campos voláteis (ex.: timestamp) do cálculo.
+    """
+    source = payload if etag_data is None else etag_data
+    etag = _digest(json.dumps(source, sort_keys=True, default=str))
+
+    if status == 200 and request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    response = make_response(jsonify(payload), status)
+    if status == 200:
+        _apply_validators(response, etag)
+    return response
@@ -0,0 +1,300 @@
+import os
+import time
+import logging
+import threading
+from contextlib import nullcontext
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+
+try:
+    import fcntl
+except ImportError:  # Windows: serialização apenas dentro do processo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ==================== SQLITE (MODO PRODUÇÃO) ====================
+
+SQLITE_DEFAULTS = {
+    "SQLITE_BUSY_TIMEOUT_MS": 5000,
+    "SQLITE_MMAP_SIZE": 64 * 1024 * 1024,
+    "SQLITE_CACHE_SIZE_KB": 16 * 1024,
+    "SQLITE_WRITE_RETRIES": 3,
+}
+
+_write_lock = threading.RLock()
+_lock_file = None
+_lock_pid = None
+_lock_depth = threading.local()
+
+
+def is_sqlite(app=None):
+    """Indica se a aplicação está usando o banco SQLite padrão (sem DATABASE_URL)"""
+    app = app or current_app
+    return app.config.get("SQLITE_PRODUCTION_MODE", False)
+
+
+def sqlite_engine_options(app):
+    """Opções de engine para o SQLite compartilhado entre workers do gunicorn"""
+    for key, default in SQLITE_DEFAULTS.items():
+        app.config.setdefault(key, int(os.environ.get(key, default)))
+    app.config["SQLITE_PRODUCTION_MODE"] = True
+
+    # O Flask-SQLAlchemy resolve caminhos relativos a partir de app.instance_path,
+    # mas só cria o próprio instance_path; garante também o subdiretório do arquivo
+    db_path = make_url(app.config["SQLALCHEMY_DATABASE_URI"]).database
+    if db_path and db_path != ":memory:" and not os.path.isabs(db_path):
+        os.makedirs(os.path.dirname(os.path.join(app.instance_path, db_path)), exist_ok=True)
+
+    return {
+        # Timeout do driver em segundos; o PRAGMA busy_timeout abaixo cobre o restante
+        "connect_args": {
+            "timeout": app.config["SQLITE_BUSY_TIMEOUT_MS"] / 1000,
+            "check_same_thread": False,
+        },
+        "pool_pre_ping": True,
+    }
+
+
+def configure_sqlite(app, engine):
+    """Aplica WAL e demais PRAGMAs em cada nova conexão do SQLite"""
+    pragmas = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}",
+        f"PRAGMA mmap_size={app.config['SQLITE_MMAP_SIZE']}",
+        # Valor negativo = tamanho em KiB, independente do page_size
+        f"PRAGMA cache_size=-{app.config['SQLITE_CACHE_SIZE_KB']}",
+        "PRAGMA temp_store=MEMORY",
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    app.config["SQLITE_LOCK_PATH"] = os.path.join(app.instance_path, "monteiro_lite.write.lock")
+    logger.info("SQLite em modo WAL (busy_timeout=%sms)", app.config["SQLITE_BUSY_TIMEOUT_MS"])
+
+
+def _is_locked_error(error):
+    message = str(getattr(error, "orig", error)).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def _acquire_file_lock(path):
+    """Lock entre processos (workers do gunicorn) via flock em um arquivo auxiliar"""
+    global _lock_file, _lock_pid
+    if fcntl is None:
+        return
+    # O descritor é aberto por processo: após um fork o herdado não é reutilizado
+    if _lock_file is None or _lock_pid != os.getpid():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _lock_file = open(path, "a")
+        _lock_pid = os.getpid()
+    fcntl.flock(_lock_file.fileno(), fcntl.LOCK_EX)
+
+
+def _release_file_lock():
+    if fcntl is not None and _lock_file is not None:
+        fcntl.flock(_lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class write_lock:
+    """Serializa escritas no SQLite entre threads e workers.
+
+    Reentrante: blocos aninhados na mesma thread não bloqueiam.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        _write_lock.acquire()
+        depth = getattr(_lock_depth, "value", 0)
+        if depth == 0:
+            try:
+                _acquire_file_lock(self.path)
+            except Exception:
+                _write_lock.release()
+                raise
+        _lock_depth.value = depth + 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _lock_depth.value -= 1
+        if _lock_depth.value == 0:
+            _release_file_lock()
+        _write_lock.release()
+        return False
+
+
+def serialized_section():
+    """Lock de escrita para código fora de views (ex.: tarefas agendadas); no-op fora do SQLite"""
+    if is_sqlite():
+        return write_lock(current_app.config["SQLITE_LOCK_PATH"])
+    return nullcontext()
+
+
+class write_transaction:
+    """Transação própria (fora da sessão da requisição) para escritas curtas.
+
+    No SQLite roda sob o lock de escrita da aplicação; nos demais bancos é um engine.begin().
+    """
+
+    def __init__(self):
+        from app import db
+        self.engine = db.engine
+        self.lock = write_lock(current_app.config["SQLITE_LOCK_PATH"]) if is_sqlite() else None
+
+    def __enter__(self):
+        if self.lock:
+            self.lock.__enter__()
+        try:
+            self.transaction = self.engine.begin()
+            return self.transaction.__enter__()
+        except Exception:
+            if self.lock:
+                self.lock.__exit__(None, None, None)
+            raise
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            return self.transaction.__exit__(exc_type, exc, tb)
+        finally:
+            if self.lock:
+                self.lock.__exit__(exc_type, exc, tb)
+
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def serialized_write(view):
+    """Executa uma view de escrita com lock de escrita e retry em "database is locked".
+
+    No SQLite a view roda com o lock exclusivo entre workers e é reexecutada
+    (após rollback) se o commit falhar por lock. Em outros bancos é transparente.
+    Views de formulário (GET + POST) só pegam o lock no POST: exibir o formulário não escreve.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_sqlite() or request.method in SAFE_METHODS:
+            return view(*args, **kwargs)
+
+        from app import db
+
+        retries = current_app.config["SQLITE_WRITE_RETRIES"]
+        for attempt in range(retries + 1):
+            try:
+                with write_lock(current_app.config["SQLITE_LOCK_PATH"]):
+                    # Encerra o snapshot de leitura aberto antes do lock (ex.: user_loader)
+                    db.session.rollback()
+                    return view(*args, **kwargs)
+            except OperationalError as e:
+                db.session.rollback()
+                if not _is_locked_error(e) or attempt == retries:
+                    raise
+                delay = 0.05 * (2 ** attempt)
+                logger.warning(f"SQLite ocupado, nova tentativa em {delay:.2f}s ({attempt + 1}/{retries})")
+                time.sleep(delay)
+
+    return wrapper
+
+
+# ==================== ÍNDICES ====================
+
+def ensure_indexes(db):
+    """Cria índices declarados nos modelos que faltam em tabelas já existentes (create_all só os cria com a tabela)"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+# ==================== POSTGRESQL (POOL E RÉPLICA DE LEITURA) ====================
+
+POSTGRES_DEFAULTS = {
+    "DB_POOL_SIZE": 5,
+    "DB_MAX_OVERFLOW": 10,
+    "DB_POOL_TIMEOUT": 30,
+    "DB_POOL_RECYCLE": 300,
+    "DB_STATEMENT_TIMEOUT_MS": 30000,
+    "DB_REPLICA_PIN_SECONDS": 10,
+}
+
+
+def postgres_engine_options(app):
+    """Opções de pool e timeouts para o banco definido em DATABASE_URL"""
+    for key, default in POSTGRES_DEFAULTS.items():
+        app.config.setdefault(key, int(os.environ.get(key, default)))
+
+    options = {
+        "pool_size": app.config["DB_POOL_SIZE"],
+        "max_overflow": app.config["DB_MAX_OVERFLOW"],
+        "pool_timeout": app.config["DB_POOL_TIMEOUT"],
+        "pool_recycle": app.config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": True,
+    }
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgres") and app.config["DB_STATEMENT_TIMEOUT_MS"]:
+        options["connect_args"] = {
+            "options": f"-c statement_timeout={app.config['DB_STATEMENT_TIMEOUT_MS']}"
+        }
+    return options
+
+
+def configure_replica(app, replica_url, engine_options):
+    """Registra a réplica de leitura como bind "replica" com as mesmas opções de pool"""
+    if not replica_url:
+        return
+    app.config["SQLALCHEMY_BINDS"] = {"replica": {"url": replica_url, **engine_options}}
+    logger.info("Réplica de leitura configurada para views somente leitura")
+
+
+def _primary_pinned():
+    """Após uma escrita o usuário lê do primário por alguns segundos (read-your-writes)"""
+    return session.get("_primary_until", 0) > time.time()
+
+
+class RoutingSession(Session):
+    """Sessão que envia as consultas de views marcadas com @read_only para a réplica.
+
+    Flushes (escritas) sempre vão para o primário.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and has_request_context()
+            and g.get("_use_replica")
+            and "replica" in self._db.engines
+            and not _primary_pinned()
+        ):
+            return self._db.engines["replica"]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def pin_to_primary(db_session, flush_context):
+    if has_request_context() and "replica" in db_session._db.engines:
+        session["_primary_until"] = time.time() + current_app.config["DB_REPLICA_PIN_SECONDS"]
+
+
+def read_only(view):
+    """Marca uma view como somente leitura: suas consultas podem ir para a réplica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._use_replica = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g._use_replica = False
+
+    return wrapper
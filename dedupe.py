@@ -0,0 +1,297 @@
+"""Deduplicação de clientes com chaves de bloqueio.
+
+Em vez de comparar todos os pares (O(n²)), cada cliente gera poucas chaves
+normalizadas (telefone, email, nome). Só clientes que compartilham uma chave
+viram candidatos, e só esses pares recebem a pontuação de similaridade.
+As chaves ficam indexadas em ``client_dedupe_keys`` para a checagem inline
+no cadastro ser uma consulta por índice.
+"""
+import re
+import logging
+import unicodedata
+from difflib import SequenceMatcher
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, delete, exists, func, select, true, update
+
+from app import db
+from database import serialized_section
+from models import Client, ClientDedupeKey, DuplicateCandidate, FollowUpMessage, KanbanCard
+from versioning import bump_versions
+from whatsapp_service import whatsapp_service
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+# Blocos maiores que isso (ex.: nome muito comum) não geram pares: a chave não discrimina
+MAX_BLOCK_SIZE = 50
+DUPLICATE_THRESHOLD = 0.6
+NAME_SIMILARITY_MIN = 0.85
+
+STATUS_PRIORITY = {'ativo': 0, 'prospect': 1, 'inativo': 2}
+
+# ==================== NORMALIZAÇÃO E CHAVES ====================
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    if not phone or not any(ch.isdigit() for ch in phone):
+        return None
+    formatted = whatsapp_service._format_phone(phone)
+    return formatted if len(formatted) >= 8 else None
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    email = (email or '').strip().lower()
+    return email or None
+
+
+def normalize_name(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    ascii_name = re.sub(r'[^a-z0-9 ]', ' ', ascii_name.lower())
+    return ' '.join(ascii_name.split()) or None
+
+
+def blocking_keys(name=None, email=None, phone=None) -> Set[str]:
+    """Chaves de bloqueio de um cliente; dois clientes só são comparados se compartilham uma"""
+    keys = set()
+    if (value := normalize_phone(phone)):
+        keys.add(f'phone:{value}')
+    if (value := normalize_email(email)):
+        keys.add(f'email:{value}')
+    if (value := normalize_name(name)):
+        keys.add(f'name:{value}')
+    return keys
+
+
+def refresh_keys(client: Client) -> None:
+    """Regrava as chaves de um cliente (chamado no cadastro/edição, dentro da transação da view)"""
+    db.session.execute(delete(ClientDedupeKey).where(ClientDedupeKey.client_id == client.id))
+    for key in blocking_keys(client.name, client.email, client.phone):
+        db.session.add(ClientDedupeKey(client_id=client.id, key=key))
+
+# ==================== PONTUAÇÃO ====================
+
+def score_pair(a, b) -> Tuple[float, List[str]]:
+    """Pontua a similaridade de dois clientes (0..1) e retorna os motivos; aceita qualquer objeto com name, email e phone"""
+    score, reasons = 0.0, []
+    phone_a = normalize_phone(a.phone)
+    if phone_a and phone_a == normalize_phone(b.phone):
+        score += 0.6
+        reasons.append('telefone')
+    email_a = normalize_email(a.email)
+    if email_a and email_a == normalize_email(b.email):
+        score += 0.6
+        reasons.append('email')
+    name_a, name_b = normalize_name(a.name), normalize_name(b.name)
+    if name_a and name_b:
+        ratio = SequenceMatcher(None, name_a, name_b).ratio()
+        if ratio >= NAME_SIMILARITY_MIN:
+            score += 0.4 * ratio
+            reasons.append('nome')
+    return min(score, 1.0), reasons
+
+
+def find_matches(name=None, email=None, phone=None, exclude_id=None) -> List[Tuple[Client, float, List[str]]]:
+    """Clientes existentes parecidos com os dados informados (consulta por índice nas chaves)"""
+    # Só telefone e email: o nome sozinho pontua no máximo 0.4 e nunca atinge DUPLICATE_THRESHOLD
+    keys = [key for key in blocking_keys(name, email, phone) if not key.startswith('name:')]
+    if not keys:
+        return []
+    # Blocos grandes demais (ex.: telefone da empresa) não discriminam, como em candidate_pairs
+    small_blocks = (
+        select(ClientDedupeKey.key)
+        .where(ClientDedupeKey.key.in_(keys))
+        .group_by(ClientDedupeKey.key)
+        .having(func.count() <= MAX_BLOCK_SIZE)
+    )
+    query = select(ClientDedupeKey.client_id).where(ClientDedupeKey.key.in_(small_blocks)).distinct()
+    if exclude_id is not None:
+        query = query.where(ClientDedupeKey.client_id != exclude_id)
+    ids = db.session.scalars(query).all()
+    if not ids:
+        return []
+
+    probe = SimpleNamespace(name=name, email=email, phone=phone)
+    matches = []
+    for client in Client.query.filter(Client.id.in_(ids)):
+        score, reasons = score_pair(probe, client)
+        if score >= DUPLICATE_THRESHOLD:
+            matches.append((client, score, reasons))
+    return sorted(matches, key=lambda match: -match[1])
+
+
+def record_candidates(client: Client, matches: Iterable[Tuple[Client, float, List[str]]]) -> None:
+    """Registra pares para revisão (o cliente mais antigo fica como client_id)"""
+    for other, score, reasons in matches:
+        first, second = sorted((client.id, other.id))
+        exists = DuplicateCandidate.query.filter_by(client_id=first, duplicate_id=second).first()
+        if exists is None:
+            db.session.add(DuplicateCandidate(
+                client_id=first, duplicate_id=second, score=score,
+                reasons=','.join(reasons), status='pendente'
+            ))
+
+# ==================== VARREDURA EM LOTES ====================
+
+def _index_clients(condition, batch_size: int) -> int:
+    """Regrava as chaves dos clientes que atendem à condição, em lotes por id"""
+    total, last_id = 0, 0
+    while True:
+        with serialized_section():
+            batch = db.session.execute(
+                select(Client.id, Client.name, Client.email, Client.phone)
+                .where(condition, Client.id > last_id).order_by(Client.id).limit(batch_size)
+            ).all()
+            if not batch:
+                db.session.rollback()
+                break
+            ids = [row.id for row in batch]
+            db.session.execute(delete(ClientDedupeKey).where(ClientDedupeKey.client_id.in_(ids)))
+            rows = [
+                {'client_id': row.id, 'key': key}
+                for row in batch for key in blocking_keys(row.name, row.email, row.phone)
+            ]
+            if rows:
+                db.session.execute(ClientDedupeKey.__table__.insert(), rows)
+            db.session.commit()
+        total += len(batch)
+        last_id = ids[-1]
+    return total
+
+
+def _purge_orphan_keys() -> None:
+    """Chaves de clientes removidos por caminhos que não passam pelo refresh_keys"""
+    with serialized_section():
+        db.session.execute(delete(ClientDedupeKey).where(
+            ~ClientDedupeKey.client_id.in_(select(Client.id))
+        ))
+        db.session.commit()
+
+
+def index_missing_keys(batch_size: int = BATCH_SIZE) -> int:
+    """Gera chaves só para clientes que ainda não têm nenhuma (criados fora das views)"""
+    indexed = _index_clients(~exists().where(ClientDedupeKey.client_id == Client.id), batch_size)
+    _purge_orphan_keys()
+    return indexed
+
+
+def rebuild_keys(batch_size: int = BATCH_SIZE) -> int:
+    """Recalcula a tabela de chaves inteira (sob demanda, ex.: após mudar a normalização)"""
+    rebuilt = _index_clients(true(), batch_size)
+    _purge_orphan_keys()
+    return rebuilt
+
+
+def candidate_pairs() -> Set[Tuple[int, int]]:
+    """Pares (id menor, id maior) que compartilham alguma chave, ignorando blocos grandes demais"""
+    small_blocks = (
+        select(ClientDedupeKey.key)
+        .group_by(ClientDedupeKey.key)
+        .having(and_(func.count() > 1, func.count() <= MAX_BLOCK_SIZE))
+    )
+    a, b = db.aliased(ClientDedupeKey), db.aliased(ClientDedupeKey)
+    rows = db.session.execute(
+        select(a.client_id, b.client_id)
+        .join(b, and_(a.key == b.key, a.client_id < b.client_id))
+        .where(a.key.in_(small_blocks))
+    ).all()
+    return {(first, second) for first, second in rows}
+
+
+def scan(batch_size: int = BATCH_SIZE, rebuild: bool = False) -> Dict[str, int]:
+    """Varredura: completa as chaves que faltam (ou recalcula todas), gera pares candidatos e pontua em lotes.
+
+    As chaves já são mantidas no cadastro e na edição; ``rebuild`` só é necessário
+    quando a normalização muda.
+    """
+    clients = rebuild_keys(batch_size) if rebuild else index_missing_keys(batch_size)
+    pairs = candidate_pairs()
+    known = {
+        (row.client_id, row.duplicate_id)
+        for row in db.session.execute(select(DuplicateCandidate.client_id, DuplicateCandidate.duplicate_id))
+    }
+    pending = sorted(pairs - known)
+    db.session.rollback()
+
+    found = 0
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        ids = {client_id for pair in chunk for client_id in pair}
+        loaded = {client.id: client for client in Client.query.filter(Client.id.in_(ids))}
+        new_candidates = []
+        for first, second in chunk:
+            if first not in loaded or second not in loaded:
+                continue
+            score, reasons = score_pair(loaded[first], loaded[second])
+            if score >= DUPLICATE_THRESHOLD:
+                new_candidates.append({
+                    'client_id': first, 'duplicate_id': second, 'score': score,
+                    'reasons': ','.join(reasons), 'status': 'pendente'
+                })
+        db.session.rollback()
+        if new_candidates:
+            with serialized_section():
+                db.session.execute(DuplicateCandidate.__table__.insert(), new_candidates)
+                db.session.commit()
+            found += len(new_candidates)
+
+    logger.info(f"Deduplicação: {clients} clientes indexados, {len(pairs)} pares bloqueados, {found} novos candidatos")
+    return {'clients': clients, 'pairs': len(pairs), 'candidates': found}
+
+# ==================== MESCLAGEM ====================
+
+def merge_clients(survivor: Client, duplicates: List[Client]) -> Client:
+    """Mescla os duplicados no sobrevivente: completa campos vazios, move cartões e follow-ups e remove os duplicados.
+
+    Não faz commit; roda dentro da transação da view.
+    """
+    duplicate_ids = [client.id for client in duplicates if client.id != survivor.id]
+    if not duplicate_ids:
+        return survivor
+
+    for duplicate in duplicates:
+        if duplicate.id == survivor.id:
+            continue
+        for field in ('email', 'phone', 'insurance_type'):
+            if not getattr(survivor, field) and getattr(duplicate, field):
+                setattr(survivor, field, getattr(duplicate, field))
+        if duplicate.notes and duplicate.notes not in (survivor.notes or ''):
+            survivor.notes = f"{survivor.notes}\n{duplicate.notes}" if survivor.notes else duplicate.notes
+        if STATUS_PRIORITY.get(duplicate.status, 9) < STATUS_PRIORITY.get(survivor.status, 9):
+            survivor.status = duplicate.status
+
+    db.session.execute(
+        update(KanbanCard).where(KanbanCard.client_id.in_(duplicate_ids)).values(client_id=survivor.id),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.execute(
+        update(FollowUpMessage).where(FollowUpMessage.client_id.in_(duplicate_ids)).values(client_id=survivor.id),
+        execution_options={'synchronize_session': False}
+    )
+    bump_versions('kanban_cards')
+
+    # Pares que envolvem os duplicados deixam de fazer sentido
+    db.session.execute(delete(DuplicateCandidate).where(db.or_(
+        DuplicateCandidate.client_id.in_(duplicate_ids),
+        DuplicateCandidate.duplicate_id.in_(duplicate_ids)
+    )))
+    db.session.execute(delete(ClientDedupeKey).where(ClientDedupeKey.client_id.in_(duplicate_ids)))
+
+    for duplicate in duplicates:
+        if duplicate.id != survivor.id:
+            db.session.delete(duplicate)
+    db.session.flush()
+    refresh_keys(survivor)
+    return survivor
+
+
+@click.command('dedupe-rebuild-keys')
+@with_appcontext
+def rebuild_keys_command():
+    """Recalcula todas as chaves de deduplicação e varre os pares"""
+    result = scan(rebuild=True)
+    click.echo(f"{result['clients']} clientes indexados, {result['candidates']} novos candidatos")
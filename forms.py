@@ -8,19 +8,27 @@ class LoginForm(FlaskForm):
     password = PasswordField('Senha', validators=[DataRequired()])
     remember_me = BooleanField('Lembrar-me')
 
+INSURANCE_TYPES = [
+    ('auto', 'Auto'),
+    ('vida', 'Vida'),
+    ('residencial', 'Residencial'),
+    ('empresarial', 'Empresarial'),
+    ('saude', 'Saúde'),
+    ('viagem', 'Viagem')
+]
+
+CARD_PRIORITIES = [
+    ('baixa', 'Baixa'),
+    ('normal', 'Normal'),
+    ('alta', 'Alta')
+]
+
 class ClientForm(FlaskForm):
     name = StringField('Nome Completo', validators=[DataRequired(), Length(max=100)])
     email = StringField('Email', validators=[Optional(), Email(), Length(max=120)])
     phone = StringField('Telefone', validators=[Optional(), Length(max=20)])
-    insurance_type = SelectField('Tipo de Seguro', choices=[
-        ('', 'Selecione...'),
-        ('auto', 'Auto'),
-        ('vida', 'Vida'),
-        ('residencial', 'Residencial'),
-        ('empresarial', 'Empresarial'),
-        ('saude', 'Saúde'),
-        ('viagem', 'Viagem')
-    ], validators=[Optional()])
+    insurance_type = SelectField('Tipo de Seguro', choices=[('', 'Selecione...')] + INSURANCE_TYPES,
+                                 validators=[Optional()])
     notes = TextAreaField('Observações', validators=[Optional()])
     status = SelectField('Status', choices=[
         ('prospect', 'Prospect'),
@@ -32,11 +40,7 @@ class KanbanCardForm(FlaskForm):
     title = StringField('Título', validators=[DataRequired(), Length(max=200)])
     description = TextAreaField('Descrição', validators=[Optional()])
     client_id = SelectField('Cliente', coerce=int, validators=[Optional()])
-    priority = SelectField('Prioridade', choices=[
-        ('baixa', 'Baixa'),
-        ('normal', 'Normal'),
-        ('alta', 'Alta')
-    ], default='normal')
+    priority = SelectField('Prioridade', choices=CARD_PRIORITIES, default='normal')
 
 class UserForm(FlaskForm):
     username = StringField('Usuário', validators=[DataRequired(), Length(min=3, max=80)])
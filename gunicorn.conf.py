@@ -0,0 +1,8 @@
+"""Configuração do gunicorn (carregada automaticamente de ./gunicorn.conf.py)."""
+
+
+def post_worker_init(worker):
+    """Inicia o agendador de tarefas em cada worker que serve requisições"""
+    from scheduler import scheduler
+
+    scheduler.start()
@@ -0,0 +1,146 @@
+"""Tarefas periódicas registradas no agendador."""
+import logging
+from datetime import datetime
+
+import analytics
+import archive
+import dedupe
+import session_watchdog
+from app import db
+from cache import cache
+from database import is_sqlite, serialized_section
+from models import KanbanCard, FollowUpMessage
+from rate_limit import send_limiter
+from scheduler import scheduler
+from whatsapp_service import whatsapp_service
+
+logger = logging.getLogger(__name__)
+
+FOLLOW_UP_BATCH_SIZE = 50
+
+
+@scheduler.job('kanban_rebalance', interval_seconds=3600)
+def rebalance_kanban_positions():
+    """Renumera order_position (1..n) em cada coluna, eliminando buracos e empates"""
+    with serialized_section():
+        cards = KanbanCard.query.order_by(
+            KanbanCard.column_id, KanbanCard.order_position, KanbanCard.id
+        ).all()
+        changed = 0
+        position, current_column = 0, None
+        for card in cards:
+            if card.column_id != current_column:
+                position, current_column = 0, card.column_id
+            position += 1
+            if card.order_position != position:
+                card.order_position = position
+                changed += 1
+        db.session.commit()
+    if changed:
+        logger.info(f"Kanban rebalanceado: {changed} cartões renumerados")
+
+
+@scheduler.job('follow_up_dispatch', interval_seconds=60)
+def dispatch_follow_ups():
+    """Envia as mensagens de follow-up vencidas, respeitando os limites de envio.
+
+    Cada follow-up é reservado antes do envio e tem o resultado gravado logo
+    depois, então um lote que passe do lease (ou um worker que caia no meio)
+    não é reenviado por outro worker.
+    """
+    if not session_watchdog.is_available():
+        # Ficam pendentes até o vigia reconectar a sessão
+        db.session.rollback()
+        return
+    session_watchdog.expire_unconfirmed(FollowUpMessage)
+    due = [
+        (follow_up.id, follow_up.client.phone if follow_up.client else None, follow_up.message, follow_up.created_by)
+        for follow_up in FollowUpMessage.query.filter(
+            FollowUpMessage.status == 'pendente',
+            FollowUpMessage.send_at <= datetime.utcnow()
+        ).order_by(FollowUpMessage.send_at).limit(FOLLOW_UP_BATCH_SIZE)
+    ]
+    # Encerra a transação de leitura: o envio pelo WPPConnect não deve segurar o banco
+    db.session.rollback()
+
+    processed = 0
+    for follow_up_id, phone, message, user_id in due:
+        if not session_watchdog.claim_message(FollowUpMessage, follow_up_id):
+            continue
+        if not phone:
+            session_watchdog.finish_message(FollowUpMessage, follow_up_id, status='erro', sent_at=None,
+                                            error='Cliente sem telefone')
+            processed += 1
+            continue
+        decision = send_limiter.acquire(user_id, whatsapp_service._format_phone(phone), whatsapp_service.session_name)
+        if not decision.allowed:
+            # Volta para a fila e fica para o próximo ciclo
+            session_watchdog.finish_message(FollowUpMessage, follow_up_id, status='pendente', sent_at=None)
+            break
+        result = whatsapp_service.send_text_message(phone, message)
+        if result.get('connection_error'):
+            # WPPConnect inalcançável: volta para a fila e as demais esperam a reconexão
+            session_watchdog.finish_message(FollowUpMessage, follow_up_id, status='pendente', sent_at=None)
+            session_watchdog.request_check()
+            break
+        if result.get('success', True) and not result.get('error'):
+            session_watchdog.finish_message(FollowUpMessage, follow_up_id, status='enviada',
+                                            sent_at=datetime.utcnow(), error=None)
+        else:
+            session_watchdog.finish_message(FollowUpMessage, follow_up_id, status='erro', sent_at=None,
+                                            error=result.get('error') or result.get('message'))
+        processed += 1
+
+    if processed:
+        logger.info(f"Follow-ups processados: {processed}")
+
+
+@scheduler.job('database_maintenance', interval_seconds=24 * 3600)
+def database_maintenance():
+    """Manutenção do SQLite: atualiza estatísticas do planner e trunca o WAL"""
+    if not is_sqlite():
+        return
+    with serialized_section():
+        db.session.execute(db.text("PRAGMA optimize"))
+        db.session.execute(db.text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        db.session.commit()
+
+
+@scheduler.job('client_dedupe_scan', interval_seconds=3600, lease_seconds=900)
+def client_dedupe_scan():
+    """Varre a base de clientes em lotes procurando possíveis duplicados"""
+    dedupe.scan()
+
+
+@scheduler.job('data_retention', interval_seconds=24 * 3600, lease_seconds=1800)
+def data_retention():
+    """Arquiva cartões encerrados antigos e clientes inativos"""
+    archive.run_retention()
+
+
+@scheduler.job('funnel_rollup', interval_seconds=3600, lease_seconds=900)
+def funnel_rollup():
+    """Consolida o log de transições do Kanban nos agregados diários do funil"""
+    analytics.rollup()
+
+
+@scheduler.job('cache_purge', interval_seconds=900)
+def cache_purge():
+    """Remove as entradas expiradas do nível compartilhado do cache"""
+    removed = cache.purge_expired()
+    if removed:
+        logger.info(f"Cache: {removed} entradas expiradas removidas")
+
+
+@scheduler.job('rate_limit_purge', interval_seconds=3600)
+def rate_limit_purge():
+    """Remove os buckets de limite de envio que já voltaram à capacidade total"""
+    removed = send_limiter.purge()
+    if removed:
+        logger.info(f"Limite de envios: {removed} buckets cheios removidos")
+
+
+@scheduler.job('whatsapp_watchdog', interval_seconds=session_watchdog.WATCHDOG_INTERVAL, lease_seconds=120)
+def whatsapp_watchdog():
+    """Acompanha a sessão do WPPConnect, reconecta com backoff e libera as mensagens retidas"""
+    session_watchdog.check_session()
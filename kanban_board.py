@@ -0,0 +1,115 @@
+"""Renderização em janelas do Kanban.
+
+O quadro carrega só os primeiros cartões de cada coluna em uma única consulta
+(ROW_NUMBER particionado por coluna) e os totais em um único GROUP BY; o resto
+vem sob demanda pelo endpoint de paginação por cursor, consumido pelo kanban.js.
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import joinedload
+
+from app import db
+from models import KanbanCard, KanbanColumn
+
+KANBAN_PAGE_SIZE = int(os.environ.get("KANBAN_PAGE_SIZE", 30))
+KANBAN_MAX_PAGE_SIZE = 100
+
+DEFAULT_COLUMNS = [
+    ('Atendimento Inicial', '#17a2b8', 1),
+    ('Propostas Enviadas', '#ffc107', 2),
+    ('Vendas em Andamento', '#fd7e14', 3),
+    ('Vendas Concluídas', '#28a745', 4),
+    ('Pós-venda', '#6f42c1', 5)
+]
+
+
+def ensure_default_columns() -> None:
+    """Cria as colunas padrão do quadro se ainda não houver nenhuma"""
+    if KanbanColumn.query.count():
+        return
+    for name, color, position in DEFAULT_COLUMNS:
+        column = KanbanColumn()
+        column.name = name
+        column.color = color
+        column.order_position = position
+        db.session.add(column)
+    db.session.commit()
+
+
+def encode_cursor(card: KanbanCard) -> str:
+    return f"{card.order_position}:{card.id}"
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[int, int]]:
+    try:
+        position, card_id = cursor.split(":", 1)
+        return int(position), int(card_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def first_cards(column_ids: List[int], limit: int = KANBAN_PAGE_SIZE) -> Dict[int, List[KanbanCard]]:
+    """Primeiros ``limit`` cartões de cada coluna, em uma consulta"""
+    if not column_ids:
+        return {}
+    ranked = (
+        select(
+            KanbanCard.id,
+            func.row_number().over(
+                partition_by=KanbanCard.column_id,
+                order_by=(KanbanCard.order_position, KanbanCard.id)
+            ).label("rn")
+        )
+        .where(KanbanCard.column_id.in_(column_ids))
+        .subquery()
+    )
+    cards = (
+        KanbanCard.query
+        .join(ranked, ranked.c.id == KanbanCard.id)
+        .filter(ranked.c.rn <= limit)
+        .options(joinedload(KanbanCard.client))
+        .order_by(KanbanCard.column_id, KanbanCard.order_position, KanbanCard.id)
+        .all()
+    )
+    by_column = {column_id: [] for column_id in column_ids}
+    for card in cards:
+        by_column[card.column_id].append(card)
+    return by_column
+
+
+def column_counts(column_ids: List[int]) -> Dict[int, int]:
+    """Total de cartões por coluna em um único GROUP BY"""
+    if not column_ids:
+        return {}
+    rows = db.session.execute(
+        select(KanbanCard.column_id, func.count(KanbanCard.id))
+        .where(KanbanCard.column_id.in_(column_ids))
+        .group_by(KanbanCard.column_id)
+    )
+    counts = {column_id: 0 for column_id in column_ids}
+    counts.update({column_id: total for column_id, total in rows})
+    return counts
+
+
+def cards_after(column_id: int, cursor: Optional[str], limit: int = KANBAN_PAGE_SIZE) -> Tuple[List[KanbanCard], Optional[str]]:
+    """Próxima página de uma coluna a partir do cursor (order_position, id); retorna (cartões, próximo cursor)"""
+    limit = max(1, min(limit, KANBAN_MAX_PAGE_SIZE))
+    query = KanbanCard.query.filter(KanbanCard.column_id == column_id)
+    after = decode_cursor(cursor) if cursor else None
+    if after:
+        position, card_id = after
+        query = query.filter(or_(
+            KanbanCard.order_position > position,
+            db.and_(KanbanCard.order_position == position, KanbanCard.id > card_id)
+        ))
+    cards = (
+        query.options(joinedload(KanbanCard.client))
+        .order_by(KanbanCard.order_position, KanbanCard.id)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(cards) > limit
+    cards = cards[:limit]
+    return cards, encode_cursor(cards[-1]) if has_more else None
@@ -1,5 +1,11 @@
+import os
+
 from app import app
+from scheduler import scheduler
 import routes
 
 if __name__ == "__main__":
+    # Com o reloader, só o processo filho (que serve as requisições) roda o agendador
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        scheduler.start()
     app.run(host="0.0.0.0", port=5000, debug=True)
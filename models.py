@@ -54,6 +54,7 @@ class KanbanColumn(db.Model):
 
 class KanbanCard(db.Model):
     __tablename__ = 'kanban_cards'
+    __table_args__ = (db.Index('ix_kanban_cards_column_position', 'column_id', 'order_position', 'id'),)
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -64,7 +65,218 @@ class KanbanCard(db.Model):
     order_position = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Relationships
+    client = db.relationship('Client', backref='kanban_cards')
+    
     def __repr__(self):
         return f'<KanbanCard {self.title}>'
 
+class DataVersion(db.Model):
+    """Carimbo de versão por tabela, incrementado a cada escrita (ETags, cache)"""
+    __tablename__ = 'data_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.name}={self.version}>'
+
+class RateLimitBucket(db.Model):
+    """Estado compartilhado dos token buckets de limite de envio (backend "db")"""
+    __tablename__ = 'rate_limit_buckets'
+    
+    key = db.Column(db.String(120), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # time.time() do último acesso
+    
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key}={self.tokens:.2f}>'
+
+class ScheduledJob(db.Model):
+    """Estado persistido de uma tarefa periódica do agendador"""
+    __tablename__ = 'scheduled_jobs'
+    
+    name = db.Column(db.String(80), primary_key=True)
+    interval_seconds = db.Column(db.Integer, nullable=False)
+    enabled = db.Column(db.Boolean, default=True, nullable=False)
+    next_run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_started_at = db.Column(db.DateTime)
+    last_finished_at = db.Column(db.DateTime)
+    last_status = db.Column(db.String(20))  # running, ok, error
+    last_error = db.Column(db.Text)
+    last_duration_ms = db.Column(db.Integer)
+    run_count = db.Column(db.Integer, default=0, nullable=False)
+    locked_by = db.Column(db.String(120))  # host:pid do worker que está executando
+    locked_until = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<ScheduledJob {self.name}>'
+
+class FollowUpMessage(db.Model):
+    """Mensagem de WhatsApp agendada para um cliente"""
+    __tablename__ = 'follow_up_messages'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    send_at = db.Column(db.DateTime, nullable=False, index=True)
+    status = db.Column(db.String(20), default='pendente', index=True)  # pendente, enviando, enviada, erro
+    sent_at = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    client = db.relationship('Client')
+    
+    def __repr__(self):
+        return f'<FollowUpMessage {self.id} {self.status}>'
+
+class ClientDedupeKey(db.Model):
+    """Chaves de bloqueio (telefone, email, nome normalizados) usadas na deduplicação"""
+    __tablename__ = 'client_dedupe_keys'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False, index=True)
+    key = db.Column(db.String(200), nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<ClientDedupeKey {self.key}>'
+
+class DuplicateCandidate(db.Model):
+    """Par de clientes possivelmente duplicados, aguardando revisão"""
+    __tablename__ = 'duplicate_candidates'
+    __table_args__ = (db.UniqueConstraint('client_id', 'duplicate_id', name='uq_duplicate_pair'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
+    duplicate_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    reasons = db.Column(db.String(100))  # ex.: "telefone,nome"
+    status = db.Column(db.String(20), default='pendente', index=True)  # pendente, ignorado
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    client = db.relationship('Client', foreign_keys=[client_id])
+    duplicate = db.relationship('Client', foreign_keys=[duplicate_id])
+    
+    def __repr__(self):
+        return f'<DuplicateCandidate {self.client_id}~{self.duplicate_id} {self.score:.2f}>'
+
+class ArchivedKanbanCard(db.Model):
+    """Cartão do Kanban arquivado pela retenção (cópia desnormalizada, sem chaves estrangeiras)"""
+    __tablename__ = 'archived_kanban_cards'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    original_id = db.Column(db.Integer, nullable=False, index=True)  # id do cartão original (pode ser reutilizado)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text)
+    client_id = db.Column(db.Integer, index=True)
+    client_name = db.Column(db.String(100))
+    column_name = db.Column(db.String(100))
+    priority = db.Column(db.String(10))
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<ArchivedKanbanCard {self.title}>'
+
+class ArchivedClient(db.Model):
+    """Cliente inativo arquivado pela retenção"""
+    __tablename__ = 'archived_clients'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    original_id = db.Column(db.Integer, nullable=False, index=True)  # id do cliente original (pode ser reutilizado)
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(120))
+    phone = db.Column(db.String(20))
+    insurance_type = db.Column(db.String(50))
+    notes = db.Column(db.Text)
+    status = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<ArchivedClient {self.name}>'
+
+class CardTransition(db.Model):
+    """Registro append-only das entradas de cartões em colunas do Kanban (criação e movimentações)"""
+    __tablename__ = 'card_transitions'
+    __table_args__ = (db.Index('ix_card_transitions_card_created', 'card_id', 'created_at', 'id'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    card_id = db.Column(db.Integer, nullable=False)  # sem FK: o histórico sobrevive ao arquivamento do cartão
+    from_column_id = db.Column(db.Integer)  # None na criação do cartão
+    to_column_id = db.Column(db.Integer, nullable=False)
+    insurance_type = db.Column(db.String(50))  # do cliente no momento da movimentação
+    user_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<CardTransition {self.card_id}: {self.from_column_id}->{self.to_column_id}>'
+
+class FunnelDailyStat(db.Model):
+    """Agregado diário do funil por coluna e tipo de seguro, gerado pela tarefa de rollup"""
+    __tablename__ = 'funnel_daily_stats'
+    __table_args__ = (db.UniqueConstraint('day', 'column_id', 'insurance_type', name='uq_funnel_day_column_type'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    column_id = db.Column(db.Integer, nullable=False)
+    insurance_type = db.Column(db.String(50), nullable=False, default='')  # '' quando não informado
+    created = db.Column(db.Integer, nullable=False, default=0)  # cartões criados nesta coluna
+    entries = db.Column(db.Integer, nullable=False, default=0)  # inclui criações
+    exits = db.Column(db.Integer, nullable=False, default=0)
+    dwell_seconds = db.Column(db.Float, nullable=False, default=0)  # tempo total na coluna das saídas do dia
+    
+    def __repr__(self):
+        return f'<FunnelDailyStat {self.day} {self.column_id} {self.insurance_type}>'
+
+class CacheEntry(db.Model):
+    """Nível compartilhado do cache (CACHE_BACKEND=db), visível por todos os workers"""
+    __tablename__ = 'cache_entries'
+    
+    key = db.Column(db.String(250), primary_key=True)
+    value = db.Column(db.Text, nullable=False)  # JSON
+    expires_at = db.Column(db.Float, nullable=False, index=True)  # time.time()
+    
+    def __repr__(self):
+        return f'<CacheEntry {self.key}>'
+
+class WhatsAppSessionState(db.Model):
+    """Último estado observado da sessão do WPPConnect e backoff da reconexão automática"""
+    __tablename__ = 'whatsapp_session_state'
+    
+    session_name = db.Column(db.String(100), primary_key=True)
+    state = db.Column(db.String(20), nullable=False)  # connected, starting, qrcode, closed, offline
+    changed_at = db.Column(db.DateTime, nullable=False)
+    checked_at = db.Column(db.DateTime, nullable=False)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    
+    def __repr__(self):
+        return f'<WhatsAppSessionState {self.session_name} {self.state}>'
+
+class WhatsAppOutboxMessage(db.Model):
+    """Mensagem retida enquanto a sessão do WhatsApp está fora; liberada na reconexão"""
+    __tablename__ = 'whatsapp_outbox'
+    __table_args__ = (
+        db.Index('ix_whatsapp_outbox_status_id', 'status', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    phone = db.Column(db.String(30), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, enviando, enviada, erro
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<WhatsAppOutboxMessage {self.id} {self.status}>'
+
 # Removidas funcionalidades pesadas para otimização
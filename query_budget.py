@@ -0,0 +1,218 @@
+"""Contador de consultas SQL por requisição e orçamento de consultas por rota.
+
+Um listener de ``before_cursor_execute`` no Engine conta as consultas de cada
+requisição agrupadas pelo texto do SQL (sem os parâmetros, então um N+1 aparece
+como o mesmo comando repetido). Ao final da requisição:
+
+- comandos executados mais de ``QUERY_REPEAT_LIMIT`` vezes são sinalizados;
+- views decoradas com ``@query_budget(n)`` não podem passar de ``n`` consultas.
+
+``QUERY_COUNTER=log`` (padrão) registra um aviso, ``raise`` (padrão com debug)
+transforma a violação em erro e ``off`` desliga. O comando
+``flask query-budgets`` percorre as rotas com orçamento e falha se alguma passar.
+"""
+import os
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import click
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNTER_MODES = ("off", "log", "raise")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Requisição acima do orçamento de consultas ou com comandos repetidos (N+1)"""
+
+
+def query_budget(max_queries: int, max_repeats: Optional[int] = None):
+    """Declara o máximo de consultas da view (e, opcionalmente, de repetições do mesmo comando)"""
+    def decorator(view):
+        view._query_budget = (max_queries, max_repeats)
+        return view
+    return decorator
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        stats = g.get("_query_stats")
+        if stats is not None:
+            stats[statement] += 1
+
+
+def _start_counting():
+    if current_app.config["QUERY_COUNTER"] != "off":
+        g._query_stats = Counter()
+
+
+def _short(statement: str, size: int = 120) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= size else statement[:size] + "..."
+
+
+def check_request(stats: Counter, budget=None) -> List[str]:
+    """Violações de uma requisição: total acima do orçamento e comandos repetidos"""
+    max_queries, max_repeats = budget or (None, None)
+    if max_repeats is None:
+        max_repeats = current_app.config["QUERY_REPEAT_LIMIT"]
+
+    problems = []
+    total = sum(stats.values())
+    if max_queries is not None and total > max_queries:
+        problems.append(f"{total} consultas (orçamento {max_queries})")
+    for statement, count in stats.most_common():
+        if count <= max_repeats:
+            break
+        problems.append(f"{count}x {_short(statement)}")
+    return problems
+
+
+def _finish_counting(response):
+    stats = g.pop("_query_stats", None)
+    if stats is None:
+        return response
+
+    view = current_app.view_functions.get(request.endpoint)
+    problems = check_request(stats, getattr(view, "_query_budget", None))
+    if current_app.debug or current_app.testing:
+        response.headers["X-Query-Count"] = str(sum(stats.values()))
+    if problems:
+        message = f"{request.method} {request.path}: " + "; ".join(problems)
+        if current_app.config["QUERY_COUNTER"] == "raise":
+            raise QueryBudgetExceeded(message)
+        logger.warning(f"Consultas suspeitas em {message}")
+    return response
+
+
+def init_query_counter(app):
+    app.config.setdefault("QUERY_COUNTER", os.environ.get("QUERY_COUNTER", "raise" if app.debug else "log"))
+    app.config.setdefault("QUERY_REPEAT_LIMIT", int(os.environ.get("QUERY_REPEAT_LIMIT", 3)))
+    if app.config["QUERY_COUNTER"] not in QUERY_COUNTER_MODES:
+        raise ValueError(f"QUERY_COUNTER deve ser um de {QUERY_COUNTER_MODES}")
+
+    # No Engine (classe) para cobrir também a réplica de leitura
+    if not event.contains(Engine, "before_cursor_execute", _count_query):
+        event.listen(Engine, "before_cursor_execute", _count_query)
+    app.before_request(_start_counting)
+    app.after_request(_finish_counting)
+    app.cli.add_command(query_budgets_command)
+
+# ==================== VERIFICAÇÃO DOS ORÇAMENTOS ====================
+
+# Na base de exemplo, 1 a cada SEED_DUPLICATE_EVERY clientes repete o nome e o
+# telefone (ou e-mail) do anterior e 1 a cada SEED_ARCHIVED_EVERY é um inativo
+# antigo, sem cartões, que a retenção leva para o arquivo
+SEED_DUPLICATE_EVERY = 5
+SEED_ARCHIVED_EVERY = 8
+
+
+def seed_sample_data(clients: int) -> None:
+    """Popula uma base vazia para que as rotas com orçamento tenham linhas de verdade.
+
+    Cada coluna do Kanban recebe um cartão por cliente ativo (mais que
+    ``KANBAN_PAGE_SIZE`` a partir de ~40 clientes); metade dos cartões das colunas
+    de encerramento e os inativos antigos são arquivados, e os clientes repetidos
+    geram pares de duplicados.
+    """
+    import analytics
+    import archive
+    import bulk
+    import dedupe
+    import kanban_board
+    from app import db
+    from forms import INSURANCE_TYPES
+    from models import Client, KanbanCard, KanbanColumn, User
+
+    if Client.query.count():
+        raise click.ClickException("--seed só pode ser usado em uma base sem clientes")
+
+    kanban_board.ensure_default_columns()
+    columns = KanbanColumn.query.filter_by(active=True).order_by(KanbanColumn.order_position).all()
+    now = datetime.utcnow()
+    old_clients = set()
+    for i in range(clients):
+        client = Client()
+        client.name = f"Cliente Exemplo {i + 1}"
+        client.email = f"cliente{i + 1}@exemplo.com.br"
+        client.phone = f"1198{i + 1:07d}"
+        if i % SEED_DUPLICATE_EVERY == SEED_DUPLICATE_EVERY - 1:
+            # Mesmo nome e, alternadamente, mesmo telefone ou mesmo e-mail do cliente anterior
+            client.name = f"Cliente Exemplo {i}"
+            if i % (2 * SEED_DUPLICATE_EVERY) < SEED_DUPLICATE_EVERY:
+                client.phone = f"1198{i:07d}"
+            else:
+                client.email = f"cliente{i}@exemplo.com.br"
+        client.status = bulk.CLIENT_STATUSES[i % len(bulk.CLIENT_STATUSES)]
+        client.insurance_type = INSURANCE_TYPES[i % len(INSURANCE_TYPES)][0]
+        if i % SEED_ARCHIVED_EVERY == SEED_ARCHIVED_EVERY - 1:
+            client.status = "inativo"
+            client.created_at = now - timedelta(days=int(archive._setting("ARCHIVE_CLIENT_AGE_DAYS")) + 30)
+            old_clients.add(i + 1)
+        db.session.add(client)
+    db.session.commit()
+
+    admin = User.query.filter_by(role="admin").first()
+    ids = [client_id for (client_id,) in db.session.query(Client.id).order_by(Client.id)]
+    active_ids = [client_id for position, client_id in enumerate(ids, 1) if position not in old_clients]
+    for column in columns:
+        bulk.create_cards(bulk.client_filters(ids=active_ids), column.id, user_id=admin.id if admin else None)
+
+    closed_names = {name.strip() for name in archive._setting("ARCHIVE_COLUMNS").split(",")}
+    closed_columns = [column.id for column in columns if column.name in closed_names]
+    KanbanCard.query.filter(KanbanCard.column_id.in_(closed_columns), KanbanCard.client_id % 2 == 0).update(
+        {"created_at": now - timedelta(days=int(archive._setting("ARCHIVE_CARD_AGE_DAYS")) + 30)},
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+    archived = archive.run_retention()
+    duplicates = dedupe.scan()
+    analytics.rollup()
+    click.echo(f"Base de exemplo: {len(active_ids)} clientes com cartões, {archived['cards']} cartões e "
+               f"{archived['clients']} clientes arquivados, {duplicates['candidates']} pares duplicados")
+
+
+@click.command("query-budgets")
+@click.option("--seed", default=0, help="Cria N clientes de exemplo antes (apenas em base vazia)")
+def query_budgets_command(seed):
+    """Executa as rotas GET com @query_budget e falha se alguma passar do orçamento"""
+    from models import User
+
+    app = current_app._get_current_object()
+    if seed:
+        seed_sample_data(seed)
+
+    admin = User.query.filter_by(role="admin").first()
+    if admin is None:
+        raise click.ClickException("Nenhum administrador cadastrado")
+
+    app.config.update(TESTING=True, QUERY_COUNTER="raise")
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(admin.id)
+        session["_fresh"] = True
+
+    failures = 0
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        budget = getattr(app.view_functions[rule.endpoint], "_query_budget", None)
+        if budget is None or "GET" not in rule.methods:
+            continue
+        # Parâmetros da rota apontam para o primeiro registro (id 1) da base populada
+        url = rule.build({argument: 1 for argument in rule.arguments}, append_unknown=False)[1]
+        try:
+            response = client.get(url)
+        except QueryBudgetExceeded as e:
+            failures += 1
+            click.echo(f"FALHOU  {e}")
+            continue
+        click.echo(f"ok      GET {url}: {response.headers.get('X-Query-Count')}/{budget[0]} consultas"
+                   f" (HTTP {response.status_code})")
+
+    if failures:
+        raise click.ClickException(f"{failures} rota(s) acima do orçamento de consultas")
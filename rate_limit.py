@@ -0,0 +1,300 @@
+"""Limite de envios do WhatsApp com token buckets.
+
+Três buckets são verificados a cada envio: por usuário, por telefone de
+destino e global por sessão do WPPConnect. Um envio só consome tokens se
+todos os buckets tiverem saldo, evitando que um bucket negado "gaste" os demais.
+
+O estado fica em memória (por worker) ou, com ``RATE_LIMIT_BACKEND=db``, na
+tabela ``rate_limit_buckets`` compartilhada entre os workers. Buckets que
+voltaram à capacidade total equivalem a buckets inexistentes e são descartados
+(na memória a cada minuto, no banco pela tarefa ``rate_limit_purge``).
+"""
+import os
+import math
+import time
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, jsonify
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from database import write_transaction
+
+logger = logging.getLogger(__name__)
+
+# "capacidade/período em segundos"
+RATE_LIMIT_DEFAULTS = {
+    "RATE_LIMIT_USER": "20/60",
+    "RATE_LIMIT_PHONE": "5/60",
+    "RATE_LIMIT_SESSION": "40/60",
+}
+
+# Escopo do bucket -> configuração; a chave do bucket é "<escopo>:<valor>"
+BUCKET_SCOPES = (("user", "RATE_LIMIT_USER"), ("phone", "RATE_LIMIT_PHONE"), ("session", "RATE_LIMIT_SESSION"))
+
+
+@dataclass
+class Bucket:
+    key: str
+    scope: str
+    capacity: float
+    refill_per_second: float
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    scope: Optional[str] = None
+    retry_after: int = 0
+
+
+def parse_rate(value: str) -> Tuple[float, float]:
+    """Converte "20/60" em (capacidade, tokens por segundo)"""
+    capacity, period = value.split("/", 1)
+    return float(capacity), float(capacity) / float(period)
+
+
+def _refill(tokens: float, updated_at: float, bucket: Bucket, now: float) -> float:
+    return min(bucket.capacity, tokens + (now - updated_at) * bucket.refill_per_second)
+
+
+def _evaluate(levels: Dict[str, float], buckets: List[Bucket]) -> Decision:
+    """Decide com base no saldo atual de cada bucket (sem consumir)"""
+    worst = None
+    for bucket in buckets:
+        if levels[bucket.key] < 1:
+            wait = (1 - levels[bucket.key]) / bucket.refill_per_second
+            if worst is None or wait > worst[1]:
+                worst = (bucket.scope, wait)
+    if worst:
+        return Decision(False, worst[0], max(1, math.ceil(worst[1])))
+    return Decision(True)
+
+# ==================== BACKENDS ====================
+
+class MemoryBackend:
+    """Buckets em memória do processo.
+
+    Os buckets cheios são descartados a cada ``PRUNE_INTERVAL_SECONDS`` (um por
+    telefone de destino cresceria sem limite).
+    """
+
+    PRUNE_INTERVAL_SECONDS = 60
+
+    def __init__(self):
+        self._state: Dict[str, Tuple[float, float]] = {}
+        self._buckets: Dict[str, Bucket] = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.time()
+
+    def acquire(self, buckets: List[Bucket]) -> Decision:
+        now = time.time()
+        with self._lock:
+            levels = {}
+            for bucket in buckets:
+                tokens, updated_at = self._state.get(bucket.key, (bucket.capacity, now))
+                levels[bucket.key] = _refill(tokens, updated_at, bucket, now)
+
+            decision = _evaluate(levels, buckets)
+            for bucket in buckets:
+                spent = 1 if decision.allowed else 0
+                self._state[bucket.key] = (levels[bucket.key] - spent, now)
+                self._buckets[bucket.key] = bucket
+            if now - self._last_prune >= self.PRUNE_INTERVAL_SECONDS:
+                self._prune(now)
+            return decision
+
+    def _prune(self, now: float) -> int:
+        full = [
+            key for key, (tokens, updated_at) in self._state.items()
+            if _refill(tokens, updated_at, self._buckets[key], now) >= self._buckets[key].capacity
+        ]
+        for key in full:
+            del self._state[key]
+            del self._buckets[key]
+        self._last_prune = now
+        return len(full)
+
+    def purge(self, scopes: List[Bucket]) -> int:
+        with self._lock:
+            return self._prune(time.time())
+
+    def levels(self, buckets: List[Bucket]) -> Dict[str, float]:
+        now = time.time()
+        with self._lock:
+            return {
+                bucket.key: _refill(*self._state.get(bucket.key, (bucket.capacity, now)), bucket, now)
+                for bucket in buckets
+            }
+
+
+class DatabaseBackend:
+    """Buckets na tabela rate_limit_buckets, compartilhados entre os workers.
+
+    Usa uma transação própria (fora da sessão da requisição): cria as linhas que
+    faltam com INSERT ... ON CONFLICT DO NOTHING e só então trava todas com
+    SELECT ... FOR UPDATE, para que dois primeiros envios simultâneos à mesma
+    chave não colidam no INSERT. No SQLite a exclusão mútua vem do lock de
+    escrita da aplicação.
+    """
+
+    @staticmethod
+    def _insert_missing(conn, table, rows: List[Dict]) -> None:
+        if conn.dialect.name in ("postgresql", "sqlite"):
+            dialect_insert = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+            conn.execute(dialect_insert(table).values(rows).on_conflict_do_nothing(index_elements=["key"]))
+            return
+        for row in rows:
+            try:
+                with conn.begin_nested():
+                    conn.execute(table.insert().values(**row))
+            except IntegrityError:
+                pass
+
+    def acquire(self, buckets: List[Bucket]) -> Decision:
+        from models import RateLimitBucket
+
+        now = time.time()
+        table = RateLimitBucket.__table__
+        with write_transaction() as conn:
+            self._insert_missing(conn, table, [
+                {"key": b.key, "tokens": b.capacity, "updated_at": now} for b in buckets
+            ])
+            rows = {
+                key: (tokens, updated_at) for key, tokens, updated_at in conn.execute(
+                    select(table.c.key, table.c.tokens, table.c.updated_at)
+                    .where(table.c.key.in_([b.key for b in buckets]))
+                    .with_for_update()
+                )
+            }
+
+            levels = {
+                bucket.key: _refill(*rows.get(bucket.key, (bucket.capacity, now)), bucket, now)
+                for bucket in buckets
+            }
+            decision = _evaluate(levels, buckets)
+            spent = 1 if decision.allowed else 0
+            for bucket in buckets:
+                values = {"tokens": levels[bucket.key] - spent, "updated_at": now}
+                if bucket.key in rows:
+                    conn.execute(table.update().where(table.c.key == bucket.key).values(**values))
+                else:
+                    # Removida pelo purge entre o INSERT e o SELECT (bucket estava cheio)
+                    self._insert_missing(conn, table, [{"key": bucket.key, **values}])
+            return decision
+
+    def purge(self, scopes: List[Bucket]) -> int:
+        """Remove as linhas cujo saldo, reabastecido até agora, já voltou à capacidade.
+
+        ``scopes`` traz um bucket modelo por escopo (chave = prefixo "<escopo>:").
+        """
+        from models import RateLimitBucket
+
+        now = time.time()
+        table = RateLimitBucket.__table__
+        removed = 0
+        with write_transaction() as conn:
+            for scope in scopes:
+                removed += conn.execute(table.delete().where(
+                    table.c.key.startswith(scope.key, autoescape=True),
+                    table.c.updated_at + (scope.capacity - table.c.tokens) / scope.refill_per_second <= now,
+                )).rowcount
+        return removed
+
+    def levels(self, buckets: List[Bucket]) -> Dict[str, float]:
+        from app import db
+        from models import RateLimitBucket
+
+        now = time.time()
+        table = RateLimitBucket.__table__
+        with db.engine.connect() as conn:
+            rows = {
+                key: (tokens, updated_at) for key, tokens, updated_at in conn.execute(
+                    select(table.c.key, table.c.tokens, table.c.updated_at)
+                    .where(table.c.key.in_([b.key for b in buckets]))
+                )
+            }
+        return {
+            bucket.key: _refill(*rows.get(bucket.key, (bucket.capacity, now)), bucket, now)
+            for bucket in buckets
+        }
+
+# ==================== LIMITADOR DE ENVIOS ====================
+
+class SendRateLimiter:
+    """Limitador dos envios do WhatsApp (usuário, destino e sessão)"""
+
+    def __init__(self):
+        self.counters = Counter()
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            name = current_app.config.get("RATE_LIMIT_BACKEND", os.environ.get("RATE_LIMIT_BACKEND", "memory"))
+            self._backend = DatabaseBackend() if name == "db" else MemoryBackend()
+        return self._backend
+
+    def _rate(self, name):
+        return parse_rate(current_app.config.get(name, os.environ.get(name, RATE_LIMIT_DEFAULTS[name])))
+
+    def buckets(self, user_id, phone, session_name) -> List[Bucket]:
+        values = {"user": user_id, "phone": phone, "session": session_name}
+        return [Bucket(f"{scope}:{values[scope]}", scope, *self._rate(setting)) for scope, setting in BUCKET_SCOPES]
+
+    def _acquire(self, buckets: List[Bucket], description: str) -> Decision:
+        decision = self.backend.acquire(buckets)
+        with self._lock:
+            if decision.allowed:
+                self.counters["allowed"] += 1
+            else:
+                self.counters["limited"] += 1
+                self.counters[f"limited_{decision.scope}"] += 1
+        if not decision.allowed:
+            logger.warning(f"Envio bloqueado pelo limite de {decision.scope} ({description})")
+        return decision
+
+    def acquire(self, user_id, phone, session_name) -> Decision:
+        return self._acquire(self.buckets(user_id, phone, session_name), f"user={user_id}, phone={phone}")
+
+    def acquire_session(self, session_name) -> Decision:
+        """Só o bucket da sessão: envios já cobrados por usuário e destino (mensagens retidas)"""
+        buckets = [b for b in self.buckets(None, None, session_name) if b.scope == "session"]
+        return self._acquire(buckets, f"session={session_name}")
+
+    def purge(self) -> int:
+        """Descarta os buckets cheios; retorna quantos foram removidos"""
+        return self.backend.purge([Bucket(f"{scope}:", scope, *self._rate(setting)) for scope, setting in BUCKET_SCOPES])
+
+    def snapshot(self, user_id, session_name) -> Dict:
+        buckets = [b for b in self.buckets(user_id, "-", session_name) if b.scope != "phone"]
+        levels = self.backend.levels(buckets)
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "backend": "db" if isinstance(self.backend, DatabaseBackend) else "memory",
+            "counters": counters,
+            "tokens": {b.scope: round(levels[b.key], 2) for b in buckets},
+            "limits": {b.scope: {"capacity": b.capacity, "per_second": round(b.refill_per_second, 4)} for b in buckets},
+        }
+
+
+def too_many_requests(decision: Decision):
+    """Resposta 429 com Retry-After para um envio negado"""
+    response = jsonify({
+        'error': 'Limite de envios atingido. Tente novamente em instantes.',
+        'scope': decision.scope,
+        'retry_after': decision.retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(decision.retry_after)
+    return response
+
+
+send_limiter = SendRateLimiter()
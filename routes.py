@@ -4,13 +4,29 @@ from werkzeug.security import check_password_hash, generate_password_hash
 from datetime import datetime, date
 import logging
 
+from sqlalchemy.orm import joinedload
+
 from app import app, db
-from models import User, Client, KanbanColumn, KanbanCard
-from forms import LoginForm, ClientForm, KanbanCardForm, UserForm
+from models import User, Client, KanbanColumn, KanbanCard, ScheduledJob, FollowUpMessage, DuplicateCandidate, ArchivedClient, ArchivedKanbanCard
+from forms import LoginForm, ClientForm, KanbanCardForm, UserForm, INSURANCE_TYPES, CARD_PRIORITIES
 from whatsapp_service import whatsapp_service
+from database import serialized_write, read_only
+from conditional import versioned, conditional_json
+from rate_limit import send_limiter, too_many_requests
+from scheduler import scheduler
+import dedupe
+import kanban_board
+import analytics
+import bulk
+import session_watchdog
+from cache import cache
+from admission import admission
+from query_budget import query_budget
 
 logger = logging.getLogger(__name__)
 
+app.cli.add_command(dedupe.rebuild_keys_command)
+
 def log_activity(action, description=None):
     """Simplified logging - removed to optimize resources"""
     pass
@@ -58,19 +74,17 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@read_only
+@query_budget(15)
 def dashboard():
-    # Get dashboard statistics
-    total_clients = Client.query.count()
-    active_clients = Client.query.filter_by(status='ativo').count()
-    prospects = Client.query.filter_by(status='prospect').count()
-    
-    # Get kanban statistics
-    kanban_stats = {}
-    columns = KanbanColumn.query.filter_by(active=True).order_by(KanbanColumn.order_position).all()
-    for column in columns:
-        kanban_stats[column.name] = KanbanCard.query.filter_by(column_id=column.id).count()
-    
-    total_cards = KanbanCard.query.count()
+    # Get dashboard statistics (shared cache, invalidated by the tables' version stamps)
+    stats = cache.get_or_set('dashboard:stats', _dashboard_stats,
+                             depends_on=('clients', 'kanban_cards', 'kanban_columns'))
+    total_clients = stats['total_clients']
+    active_clients = stats['active_clients']
+    prospects = stats['prospects']
+    kanban_stats = dict(stats['kanban_stats'])
+    total_cards = stats['total_cards']
     
     # Get WhatsApp status for dashboard
     try:
@@ -100,36 +114,74 @@ def dashboard():
                          qr_code=qr_code,
                          recent_clients=recent_clients)
 
+def _dashboard_stats():
+    """Contagens do dashboard (clientes por status e cartões por coluna)"""
+    columns = KanbanColumn.query.filter_by(active=True).order_by(KanbanColumn.order_position).all()
+    counts = kanban_board.column_counts([column.id for column in columns])
+    by_status = dict(db.session.query(Client.status, db.func.count(Client.id)).group_by(Client.status).all())
+    
+    return {
+        'total_clients': sum(by_status.values()),
+        'active_clients': by_status.get('ativo', 0),
+        'prospects': by_status.get('prospect', 0),
+        # Lista de pares para preservar a ordem das colunas após a serialização em JSON
+        'kanban_stats': [[column.name, counts[column.id]] for column in columns],
+        'total_cards': KanbanCard.query.count()
+    }
+
 @app.route('/kanban')
 @login_required
+@read_only
+@query_budget(10)
 def kanban():
     # Initialize default columns if they don't exist
-    if KanbanColumn.query.count() == 0:
-        default_columns = [
-            ('Atendimento Inicial', '#17a2b8', 1),
-            ('Propostas Enviadas', '#ffc107', 2),
-            ('Vendas em Andamento', '#fd7e14', 3),
-            ('Vendas Concluídas', '#28a745', 4),
-            ('Pós-venda', '#6f42c1', 5)
-        ]
-        
-        for name, color, position in default_columns:
-            column = KanbanColumn()
-            column.name = name
-            column.color = color
-            column.order_position = position
-            db.session.add(column)
-        
-        db.session.commit()
+    kanban_board.ensure_default_columns()
     
     columns = KanbanColumn.query.filter_by(active=True).order_by(KanbanColumn.order_position).all()
+    column_ids = [column.id for column in columns]
+    # Só a primeira janela de cada coluna; o restante é carregado pelo kanban.js ao rolar
+    cards = kanban_board.first_cards(column_ids)
+    counts = kanban_board.column_counts(column_ids)
+    cursors = {
+        column_id: kanban_board.encode_cursor(cards[column_id][-1])
+        if counts[column_id] > len(cards[column_id]) else None
+        for column_id in column_ids
+    }
     clients = Client.query.all()
     users = User.query.filter_by(active=True).all()
     
-    return render_template('kanban.html', columns=columns, clients=clients, users=users)
+    return render_template('kanban.html', columns=columns, cards=cards, counts=counts, cursors=cursors,
+                           clients=clients, users=users)
+
+@app.route('/analytics')
+@login_required
+@read_only
+@query_budget(8)
+def funnel_analytics():
+    """Funil de vendas a partir dos agregados diários"""
+    days = request.args.get('days', 90, type=int)
+    report = analytics.funnel_report(days or None)
+    
+    return render_template('analytics.html', report=report, days=days)
+
+@app.route('/api/kanban/columns/<int:column_id>/cards')
+@login_required
+@read_only
+@query_budget(4)
+def api_kanban_column_cards(column_id):
+    """Próxima janela de cartões de uma coluna (paginação por cursor)"""
+    limit = request.args.get('limit', kanban_board.KANBAN_PAGE_SIZE, type=int)
+    cards, next_cursor = kanban_board.cards_after(column_id, request.args.get('after'), limit)
+    
+    return jsonify({
+        'html': render_template('_kanban_cards.html', cards=cards),
+        'count': len(cards),
+        'next_cursor': next_cursor
+    })
 
 @app.route('/kanban/card', methods=['POST'])
 @login_required
+@serialized_write
 def create_kanban_card():
     form = KanbanCardForm()
     clients = Client.query.all()
@@ -149,6 +201,8 @@ def create_kanban_card():
         card.order_position = max_position + 1
         
         db.session.add(card)
+        db.session.flush()
+        analytics.record_transition(card, None, current_user.id)
         db.session.commit()
         
         log_activity('kanban_card_created', f'Cartão criado: {card.title}')
@@ -159,6 +213,7 @@ def create_kanban_card():
 
 @app.route('/kanban/card/<int:card_id>/move', methods=['POST'])
 @login_required
+@serialized_write
 def move_kanban_card(card_id):
     card = KanbanCard.query.get_or_404(card_id)
     data = request.get_json()
@@ -176,9 +231,13 @@ def move_kanban_card(card_id):
         else:
             other_card.order_position = i + 1
     
+    old_column_id = card.column_id
     card.column_id = new_column_id
     card.order_position = new_position
     
+    if new_column_id != old_column_id:
+        analytics.record_transition(card, old_column_id, current_user.id)
+    
     db.session.commit()
     
     log_activity('kanban_card_moved', f'Cartão movido: {card.title}')
@@ -187,33 +246,98 @@ def move_kanban_card(card_id):
 
 @app.route('/clients')
 @login_required
+@read_only
+@query_budget(6)
 def clients():
     page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
     status_filter = request.args.get('status', '')
+    insurance_filter = request.args.get('insurance_type', '')
     
-    query = Client.query
-    
-    if search:
-        query = query.filter(
-            db.or_(
-                Client.name.ilike(f'%{search}%'),
-                Client.email.ilike(f'%{search}%'),
-                Client.phone.ilike(f'%{search}%')
-            )
-        )
-    
-    if status_filter:
-        query = query.filter_by(status=status_filter)
+    query = Client.query.filter(*bulk.client_filters(
+        search=search, status=status_filter, insurance_type=insurance_filter
+    ))
     
     clients = query.order_by(Client.created_at.desc()).paginate(
         page=page, per_page=20, error_out=False
     )
+    columns = KanbanColumn.query.filter_by(active=True).order_by(KanbanColumn.order_position).all()
     
-    return render_template('clients.html', clients=clients, search=search, status_filter=status_filter)
+    return render_template('clients.html', clients=clients, search=search, status_filter=status_filter,
+                           insurance_filter=insurance_filter, insurance_types=INSURANCE_TYPES,
+                           columns=columns)
+
+@app.route('/clients/bulk', methods=['POST'])
+@login_required
+def bulk_clients():
+    """Operação em massa sobre os clientes selecionados ou sobre todos os que atendem aos filtros"""
+    data = request.get_json() if request.is_json else request.form.to_dict()
+    action = data.get('action')
+    
+    scope = data.get('scope')
+    if scope == 'filter':
+        filters = bulk.client_filters(
+            search=data.get('search'), status=data.get('status_filter'), insurance_type=data.get('insurance_type')
+        )
+        # Filtro vazio casaria a base inteira: isso exige o escopo explícito 'all'
+        if not filters:
+            return _bulk_response({'error': 'Nenhum filtro definido'}, 400)
+    elif scope == 'all':
+        if action == 'delete':
+            return _bulk_response({'error': 'A exclusão em massa exige seleção ou filtro'}, 400)
+        filters = []
+    else:
+        raw_ids = data.get('ids') if request.is_json else request.form.getlist('ids')
+        try:
+            ids = [int(client_id) for client_id in raw_ids or []]
+        except (TypeError, ValueError):
+            ids = []
+        if not ids:
+            return _bulk_response({'error': 'Nenhum cliente selecionado'}, 400)
+        filters = bulk.client_filters(ids=ids)
+    
+    if action == 'status':
+        if data.get('status') not in bulk.CLIENT_STATUSES:
+            return _bulk_response({'error': 'Status inválido'}, 400)
+        report = bulk.set_status(filters, data['status'])
+    elif action == 'kanban':
+        try:
+            column = db.session.get(KanbanColumn, int(data.get('column_id') or 0))
+        except (TypeError, ValueError):
+            column = None
+        if column is None:
+            return _bulk_response({'error': 'Coluna inválida'}, 400)
+        priority = data.get('priority') or 'normal'
+        if priority not in dict(CARD_PRIORITIES):
+            return _bulk_response({'error': 'Prioridade inválida'}, 400)
+        report = bulk.create_cards(filters, column.id, priority, data.get('title_prefix'), current_user.id)
+    elif action == 'delete':
+        if not current_user.is_admin():
+            return _bulk_response({'error': 'Apenas administradores podem excluir clientes'}, 403)
+        report = bulk.delete_clients(filters)
+    else:
+        return _bulk_response({'error': 'Ação inválida'}, 400)
+    
+    log_activity('clients_bulk', f"Operação em massa {report['action']}: {report['affected']} clientes")
+    return _bulk_response(dict(report, success=True))
+
+def _bulk_response(payload, status=200):
+    """JSON para chamadas de API; flash + redirecionamento para o formulário da listagem"""
+    if request.is_json:
+        return jsonify(payload), status
+    
+    if payload.get('error'):
+        flash(payload['error'], 'danger')
+    else:
+        flash(f"{payload['affected']} de {payload['matched']} cliente(s) processado(s) "
+              f"em {payload['chunks']} lote(s) ({payload['elapsed_ms']} ms).", 'success')
+    return redirect(url_for('clients', search=request.form.get('search', ''),
+                            status=request.form.get('status_filter', ''),
+                            insurance_type=request.form.get('insurance_type', '')))
 
 @app.route('/clients/new', methods=['GET', 'POST'])
 @login_required
+@serialized_write
 def new_client():
     form = ClientForm()
     
@@ -226,17 +350,26 @@ def new_client():
         client.notes = form.notes.data
         client.status = form.status.data
         
+        matches = dedupe.find_matches(client.name, client.email, client.phone)
+        
         db.session.add(client)
+        db.session.flush()
+        dedupe.refresh_keys(client)
+        dedupe.record_candidates(client, matches)
         db.session.commit()
         
         log_activity('client_created', f'Cliente criado: {client.name}')
         flash('Cliente criado com sucesso!', 'success')
+        if matches:
+            names = ', '.join(match.name for match, _, _ in matches[:3])
+            flash(f'Possível duplicado de: {names}. Revise em Duplicados.', 'warning')
         return redirect(url_for('clients'))
     
     return render_template('client_form.html', form=form, title='Novo Cliente')
 
 @app.route('/clients/<int:client_id>/edit', methods=['GET', 'POST'])
 @login_required
+@serialized_write
 def edit_client(client_id):
     client = Client.query.get_or_404(client_id)
     form = ClientForm(obj=client)
@@ -244,6 +377,7 @@ def edit_client(client_id):
     if form.validate_on_submit():
         form.populate_obj(client)
         client.updated_at = datetime.utcnow()
+        dedupe.refresh_keys(client)
         
         db.session.commit()
         
@@ -253,10 +387,101 @@ def edit_client(client_id):
     
     return render_template('client_form.html', form=form, title='Editar Cliente', client=client)
 
+@app.route('/clients/duplicates')
+@login_required
+@query_budget(6)
+def client_duplicates():
+    """Pares de clientes possivelmente duplicados aguardando revisão"""
+    page = request.args.get('page', 1, type=int)
+    candidates = DuplicateCandidate.query.options(
+        joinedload(DuplicateCandidate.client), joinedload(DuplicateCandidate.duplicate)
+    ).filter_by(status='pendente').order_by(
+        DuplicateCandidate.score.desc(), DuplicateCandidate.id
+    ).paginate(page=page, per_page=20, error_out=False)
+    
+    return render_template('duplicates.html', candidates=candidates)
+
+@app.route('/clients/duplicates/<int:candidate_id>/merge', methods=['POST'])
+@login_required
+@serialized_write
+def merge_duplicate(candidate_id):
+    candidate = DuplicateCandidate.query.get_or_404(candidate_id)
+    keep_id = request.form.get('keep', candidate.client_id, type=int)
+    if keep_id not in (candidate.client_id, candidate.duplicate_id):
+        flash('Cliente inválido para manter.', 'danger')
+        return redirect(url_for('client_duplicates'))
+    
+    survivor = candidate.client if keep_id == candidate.client_id else candidate.duplicate
+    duplicate = candidate.duplicate if keep_id == candidate.client_id else candidate.client
+    duplicate_name = duplicate.name
+    
+    dedupe.merge_clients(survivor, [duplicate])
+    db.session.commit()
+    
+    log_activity('clients_merged', f'Cliente {duplicate_name} mesclado em {survivor.name}')
+    flash(f'Cliente {duplicate_name} mesclado em {survivor.name}.', 'success')
+    return redirect(url_for('client_duplicates'))
+
+@app.route('/clients/duplicates/<int:candidate_id>/ignore', methods=['POST'])
+@login_required
+@serialized_write
+def ignore_duplicate(candidate_id):
+    candidate = DuplicateCandidate.query.get_or_404(candidate_id)
+    candidate.status = 'ignorado'
+    db.session.commit()
+    
+    flash('Par marcado como não duplicado.', 'info')
+    return redirect(url_for('client_duplicates'))
+
+@app.route('/clients/duplicates/scan', methods=['POST'])
+@login_required
+def scan_duplicates():
+    scheduler.run_now('client_dedupe_scan')
+    flash('Verificação de duplicados agendada.', 'info')
+    return redirect(url_for('client_duplicates'))
+
+@app.route('/archive')
+@login_required
+@read_only
+@query_budget(5)
+def archive_search():
+    """Busca nos cartões e clientes arquivados pela retenção"""
+    page = request.args.get('page', 1, type=int)
+    search = request.args.get('search', '')
+    kind = request.args.get('type', 'cards')
+    
+    if kind == 'clients':
+        query = ArchivedClient.query
+        if search:
+            query = query.filter(
+                db.or_(
+                    ArchivedClient.name.ilike(f'%{search}%'),
+                    ArchivedClient.email.ilike(f'%{search}%'),
+                    ArchivedClient.phone.ilike(f'%{search}%')
+                )
+            )
+        order = ArchivedClient.archived_at.desc()
+    else:
+        kind = 'cards'
+        query = ArchivedKanbanCard.query
+        if search:
+            query = query.filter(
+                db.or_(
+                    ArchivedKanbanCard.title.ilike(f'%{search}%'),
+                    ArchivedKanbanCard.client_name.ilike(f'%{search}%')
+                )
+            )
+        order = ArchivedKanbanCard.archived_at.desc()
+    
+    results = query.order_by(order).paginate(page=page, per_page=20, error_out=False)
+    
+    return render_template('archive.html', results=results, search=search, kind=kind)
+
 # WhatsApp funcionalidade removida para otimização
 
 @app.route('/users')
 @login_required
+@query_budget(4)
 def users():
     if not current_user.is_admin():
         flash('Acesso negado. Apenas administradores podem gerenciar usuários.', 'danger')
@@ -269,6 +494,7 @@ def users():
 
 @app.route('/whatsapp')
 @login_required
+@read_only
 def whatsapp():
     """Página principal do WhatsApp"""
     # Verificar status da conexão
@@ -307,7 +533,11 @@ def start_whatsapp_session():
     """Inicia uma nova sessão do WhatsApp"""
     try:
         result = whatsapp_service.start_session()
-        if result.get('success', True):
+        # O vigia acompanha a inicialização e tenta de novo com backoff se falhar
+        session_watchdog.request_check()
+        if result.get('error'):
+            flash('WPPConnect indisponível no momento; a sessão será reconectada automaticamente.', 'warning')
+        elif result.get('success', True):
             flash('Sessão do WhatsApp iniciada com sucesso!', 'success')
             log_activity('whatsapp_session_start', 'Sessão do WhatsApp iniciada')
         else:
@@ -344,12 +574,14 @@ def whatsapp_status():
         is_connected = whatsapp_service.is_connected()
         health = whatsapp_service.health_check()
         
-        return jsonify({
+        payload = {
             'connected': is_connected,
             'status': status,
             'health': health,
-            'timestamp': datetime.now().isoformat()
-        })
+            'session': session_watchdog.snapshot()
+        }
+        # O timestamp fica fora da ETag para que polls sem mudança recebam 304
+        return conditional_json({**payload, 'timestamp': datetime.now().isoformat()}, etag_data=payload)
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -357,6 +589,40 @@ def whatsapp_status():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+def _hold_whatsapp_message(phone, message):
+    """Retém a mensagem enquanto a sessão do WhatsApp reconecta"""
+    session_watchdog.hold_message(phone, message, current_user.id)
+    log_activity('whatsapp_message_held', f'Mensagem para {phone} retida até a reconexão')
+    return jsonify({
+        'success': True,
+        'queued': True,
+        'message': 'WhatsApp reconectando: a mensagem será enviada assim que a sessão voltar.'
+    }), 202
+
+def _send_whatsapp_text(phone, message, activity, description):
+    """Limite de envio -> sessão disponível -> envio; retém a mensagem só com o WPPConnect inalcançável"""
+    # Usuário e destino são cobrados aqui; a liberação das retidas só consome o limite da sessão
+    decision = send_limiter.acquire(current_user.id, whatsapp_service._format_phone(phone), whatsapp_service.session_name)
+    if not decision.allowed:
+        return too_many_requests(decision)
+    
+    if not session_watchdog.is_available():
+        return _hold_whatsapp_message(phone, message)
+    
+    result = whatsapp_service.send_text_message(phone, message)
+    if result.get('connection_error'):
+        # A requisição não chegou ao WPPConnect: a sessão pode ter acabado de cair
+        session_watchdog.request_check()
+        return _hold_whatsapp_message(phone, message)
+    if result.get('error'):
+        # Recusada pelo WPPConnect (4xx/5xx) ou sem confirmação: não é retida para não duplicar
+        return jsonify({'error': result['error']}), 502
+    
+    if result.get('success', True):
+        log_activity(activity, description)
+        return jsonify({'success': True, 'result': result})
+    return jsonify({'error': result.get('message', 'Erro ao enviar mensagem')}), 500
+
 @app.route('/whatsapp/send-message', methods=['POST'])
 @login_required
 def send_whatsapp_message():
@@ -369,25 +635,41 @@ def send_whatsapp_message():
         if not phone or not message:
             return jsonify({'error': 'Telefone e mensagem são obrigatórios'}), 400
         
-        result = whatsapp_service.send_text_message(phone, message)
-        
-        if result.get('success', True):
-            log_activity('whatsapp_message_sent', f'Mensagem enviada para {phone}')
-            return jsonify({'success': True, 'result': result})
-        else:
-            return jsonify({'error': result.get('message', 'Erro ao enviar mensagem')}), 500
+        return _send_whatsapp_text(phone, message, 'whatsapp_message_sent', f'Mensagem enviada para {phone}')
             
     except Exception as e:
         logger.error(f"Erro ao enviar mensagem WhatsApp: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/whatsapp/rate-limits', methods=['GET'])
+@login_required
+def whatsapp_rate_limits():
+    """Contadores e saldo dos limites de envio do WhatsApp"""
+    return jsonify(send_limiter.snapshot(current_user.id, whatsapp_service.session_name))
+
+@app.route('/admin/cache', methods=['GET'])
+@login_required
+def cache_stats():
+    """Estatísticas do cache (acertos, faltas, remoções do LRU)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Acesso negado'}), 403
+    return jsonify(cache.stats())
+
+@app.route('/admin/admission', methods=['GET'])
+@login_required
+def admission_stats():
+    """Requisições ativas, em espera e recusadas por classe neste worker"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Acesso negado'}), 403
+    return jsonify(admission.snapshot())
+
 @app.route('/whatsapp/contacts', methods=['GET'])
 @login_required
 def get_whatsapp_contacts():
     """Obtém lista de contatos do WhatsApp"""
     try:
         contacts = whatsapp_service.get_all_contacts()
-        return jsonify(contacts)
+        return conditional_json(contacts)
     except Exception as e:
         logger.error(f"Erro ao obter contatos WhatsApp: {e}")
         return jsonify({'error': str(e)}), 500
@@ -398,7 +680,7 @@ def get_whatsapp_chats():
     """Obtém lista de conversas do WhatsApp"""
     try:
         chats = whatsapp_service.get_all_chats()
-        return jsonify(chats)
+        return conditional_json(chats)
     except Exception as e:
         logger.error(f"Erro ao obter conversas WhatsApp: {e}")
         return jsonify({'error': str(e)}), 500
@@ -418,20 +700,56 @@ def send_whatsapp_to_client(client_id):
         if not client.phone:
             return jsonify({'error': 'Cliente não possui telefone cadastrado'}), 400
         
-        result = whatsapp_service.send_text_message(client.phone, message)
-        
-        if result.get('success', True):
-            log_activity('client_whatsapp_sent', f'WhatsApp enviado para cliente {client.name}')
-            return jsonify({'success': True, 'result': result})
-        else:
-            return jsonify({'error': result.get('message', 'Erro ao enviar mensagem')}), 500
+        return _send_whatsapp_text(client.phone, message, 'client_whatsapp_sent',
+                                   f'WhatsApp enviado para cliente {client.name}')
             
     except Exception as e:
         logger.error(f"Erro ao enviar WhatsApp para cliente {client_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/client/<int:client_id>/send-document', methods=['POST'])
+@login_required
+def send_document_to_client(client_id):
+    """Envia um documento (apólice, foto) ao cliente com upload em streaming para o WPPConnect"""
+    client = Client.query.get_or_404(client_id)
+    upload = request.files.get('file')
+    
+    if not upload or not upload.filename:
+        return jsonify({'error': 'Arquivo é obrigatório'}), 400
+    
+    if not client.phone:
+        return jsonify({'error': 'Cliente não possui telefone cadastrado'}), 400
+    
+    if not session_watchdog.is_available():
+        # O upload não é retido: o arquivo temporário não sobrevive à requisição
+        response = jsonify({'error': 'WhatsApp reconectando. Tente enviar o documento em instantes.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(session_watchdog.WATCHDOG_INTERVAL)
+        return response
+    
+    decision = send_limiter.acquire(current_user.id, whatsapp_service._format_phone(client.phone), whatsapp_service.session_name)
+    if not decision.allowed:
+        return too_many_requests(decision)
+    
+    # upload.stream é um arquivo temporário em disco acima de ~500 KB: lido em blocos, nunca inteiro na memória
+    result = whatsapp_service.send_file_stream(
+        client.phone,
+        upload.stream,
+        upload.filename,
+        caption=request.form.get('caption', ''),
+        content_type=upload.mimetype
+    )
+    
+    if result.get('success', True):
+        log_activity('client_document_sent', f'Documento {upload.filename} enviado para cliente {client.name}')
+        return jsonify({'success': True, 'result': result})
+    else:
+        logger.error(f"Erro ao enviar documento para cliente {client_id}: {result.get('error')}")
+        return jsonify({'error': result.get('error') or result.get('message', 'Erro ao enviar arquivo')}), 500
+
 @app.route('/users/new', methods=['GET', 'POST'])
 @login_required
+@serialized_write
 def new_user():
     if not current_user.is_admin():
         flash('Acesso negado. Apenas administradores podem criar usuários.', 'danger')
@@ -471,16 +789,19 @@ def new_user():
 
 @app.route('/api/kanban/cards')
 @login_required
+@read_only
+@versioned('kanban_cards', 'clients')
+@query_budget(4)
 def api_kanban_cards():
-    cards = KanbanCard.query.all()
+    cards = KanbanCard.query.options(joinedload(KanbanCard.client)).all()
     return jsonify([{
         'id': card.id,
         'title': card.title,
         'description': card.description,
         'client_name': card.client.name if card.client else None,
-        'responsible_name': card.responsible_user.name if card.responsible_user else None,
+        'responsible_name': None,  # KanbanCard não possui responsável
         'priority': card.priority,
-        'due_date': card.due_date.isoformat() if card.due_date else None,
+        'due_date': None,  # KanbanCard não possui data de vencimento
         'column_id': card.column_id,
         'order_position': card.order_position
     } for card in cards])
@@ -489,6 +810,7 @@ def api_kanban_cards():
 
 @app.route('/users/<int:user_id>/edit', methods=['GET', 'POST'])
 @login_required
+@serialized_write
 def edit_user(user_id):
     if not current_user.is_admin():
         flash('Acesso negado. Apenas administradores podem editar usuários.', 'danger')
@@ -527,6 +849,7 @@ def edit_user(user_id):
 
 @app.route('/users/<int:user_id>/toggle', methods=['POST'])
 @login_required
+@serialized_write
 def toggle_user_status(user_id):
     if not current_user.is_admin():
         return jsonify({'success': False, 'error': 'Acesso negado'})
@@ -540,6 +863,67 @@ def toggle_user_status(user_id):
     
     return jsonify({'success': True})
 
+# ==================== TAREFAS AGENDADAS ====================
+
+@app.route('/admin/jobs')
+@login_required
+@query_budget(5)
+def scheduled_jobs():
+    if not current_user.is_admin():
+        flash('Acesso negado. Apenas administradores podem ver as tarefas agendadas.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    jobs = ScheduledJob.query.order_by(ScheduledJob.name).all()
+    pending_follow_ups = FollowUpMessage.query.filter_by(status='pendente').count()
+    return render_template('jobs.html', jobs=jobs, pending_follow_ups=pending_follow_ups, now=datetime.utcnow())
+
+@app.route('/admin/jobs/<name>/run', methods=['POST'])
+@login_required
+def run_scheduled_job(name):
+    if not current_user.is_admin():
+        flash('Acesso negado. Apenas administradores podem executar tarefas.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    if name not in scheduler.jobs:
+        flash('Tarefa não encontrada.', 'danger')
+    else:
+        scheduler.run_now(name)
+        flash(f'Tarefa {name} agendada para execução imediata.', 'info')
+    return redirect(url_for('scheduled_jobs'))
+
+@app.route('/client/<int:client_id>/follow-ups', methods=['POST'])
+@login_required
+@serialized_write
+def schedule_follow_up(client_id):
+    """Agenda uma mensagem de WhatsApp para o cliente (enviada pelo agendador)"""
+    client = Client.query.get_or_404(client_id)
+    data = request.get_json() or {}
+    message = data.get('message')
+    
+    if not message:
+        return jsonify({'error': 'Mensagem é obrigatória'}), 400
+    
+    if not client.phone:
+        return jsonify({'error': 'Cliente não possui telefone cadastrado'}), 400
+    
+    try:
+        send_at = datetime.fromisoformat(data['send_at']) if data.get('send_at') else datetime.utcnow()
+    except ValueError:
+        return jsonify({'error': 'Data de envio inválida (use ISO 8601)'}), 400
+    
+    follow_up = FollowUpMessage()
+    follow_up.client_id = client.id
+    follow_up.message = message
+    follow_up.send_at = send_at
+    follow_up.created_by = current_user.id
+    
+    db.session.add(follow_up)
+    db.session.commit()
+    
+    log_activity('follow_up_scheduled', f'Follow-up agendado para cliente {client.name}')
+    
+    return jsonify({'success': True, 'follow_up_id': follow_up.id})
+
 # Error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -0,0 +1,210 @@
+"""Agendador de tarefas periódicas em processo.
+
+Cada worker do gunicorn roda uma thread que verifica as tarefas vencidas na
+tabela ``scheduled_jobs``. Antes de executar, o worker "reserva" a tarefa com um
+UPDATE condicional (lease com ``locked_until``); só quem afetou a linha executa,
+então cada tarefa roda em um único worker por vez. Se o worker morrer, o lease
+expira e outro assume. As execuções usam um pool de threads limitado.
+"""
+import os
+import time
+import socket
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from sqlalchemy import and_, case, or_, select, update
+
+from database import write_transaction
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JobSpec:
+    name: str
+    func: Callable[[], object]
+    interval_seconds: int
+    lease_seconds: int
+
+
+class Scheduler:
+    """Registro de tarefas e loop de disparo"""
+
+    def __init__(self):
+        self.jobs: Dict[str, JobSpec] = {}
+        self.app = None
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._running = set()
+        self._running_lock = threading.Lock()
+
+    def job(self, name, interval_seconds, lease_seconds=300):
+        """Decorator que registra uma função como tarefa periódica"""
+        def decorator(func):
+            self.jobs[name] = JobSpec(name, func, interval_seconds, lease_seconds)
+            return func
+        return decorator
+
+    @property
+    def worker_id(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def init_app(self, app):
+        """Sincroniza as tarefas registradas com a tabela.
+
+        A thread não é iniciada aqui: importar ``app`` (comandos ``flask``, shells,
+        scripts) não deve disparar tarefas. Quem serve requisições chama ``start()``
+        (gunicorn.conf.py em cada worker, main.py no servidor de desenvolvimento).
+        """
+        from app import db
+        from models import ScheduledJob
+
+        self.app = app
+        app.config.setdefault("SCHEDULER_ENABLED", os.environ.get("SCHEDULER_ENABLED", "1") == "1")
+        app.config.setdefault("SCHEDULER_TICK_SECONDS", int(os.environ.get("SCHEDULER_TICK_SECONDS", 5)))
+        app.config.setdefault("SCHEDULER_MAX_WORKERS", int(os.environ.get("SCHEDULER_MAX_WORKERS", 2)))
+
+        existing = {job.name: job for job in ScheduledJob.query.all()}
+        for spec in self.jobs.values():
+            row = existing.get(spec.name)
+            if row is None:
+                row = ScheduledJob(name=spec.name, next_run_at=datetime.utcnow(), run_count=0, enabled=True)
+                db.session.add(row)
+            row.interval_seconds = spec.interval_seconds
+        db.session.commit()
+
+    def start(self):
+        """Inicia a thread do agendador neste processo (no-op com SCHEDULER_ENABLED=0)"""
+        if not self.app.config["SCHEDULER_ENABLED"]:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.app.config["SCHEDULER_MAX_WORKERS"], thread_name_prefix="job"
+        )
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"Agendador iniciado ({self.worker_id}, {len(self.jobs)} tarefas)")
+
+    def stop(self):
+        self._stop.set()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def _loop(self):
+        while not self._stop.wait(self.app.config["SCHEDULER_TICK_SECONDS"]):
+            try:
+                with self.app.app_context():
+                    self.dispatch_due_jobs()
+            except Exception as e:
+                logger.error(f"Erro no loop do agendador: {e}")
+
+    def dispatch_due_jobs(self):
+        """Reserva e dispara as tarefas vencidas que ainda não estão em execução"""
+        from models import ScheduledJob
+
+        now = datetime.utcnow()
+        with write_transaction() as conn:
+            due = conn.execute(
+                select(ScheduledJob.name).where(
+                    ScheduledJob.enabled.is_(True),
+                    ScheduledJob.next_run_at <= now,
+                    or_(ScheduledJob.locked_until.is_(None), ScheduledJob.locked_until < now),
+                )
+            ).scalars().all()
+
+        for name in due:
+            spec = self.jobs.get(name)
+            if spec is None:
+                continue
+            with self._running_lock:
+                if name in self._running:
+                    continue
+            if self._claim(spec, now):
+                with self._running_lock:
+                    self._running.add(name)
+                self._executor.submit(self._run, spec)
+
+    def _claim(self, spec, now):
+        """UPDATE condicional: só um worker consegue reservar a tarefa"""
+        from models import ScheduledJob
+
+        with write_transaction() as conn:
+            result = conn.execute(
+                update(ScheduledJob)
+                .where(
+                    ScheduledJob.name == spec.name,
+                    ScheduledJob.next_run_at <= now,
+                    or_(ScheduledJob.locked_until.is_(None), ScheduledJob.locked_until < now),
+                )
+                .values(
+                    locked_by=self.worker_id,
+                    locked_until=now + timedelta(seconds=spec.lease_seconds),
+                    last_status="running",
+                    last_started_at=now,
+                )
+            )
+        return result.rowcount == 1
+
+    def _run(self, spec):
+        from app import db
+        from models import ScheduledJob
+
+        started = time.monotonic()
+        status, error = "ok", None
+        try:
+            with self.app.app_context():
+                try:
+                    spec.func()
+                except Exception as e:
+                    db.session.rollback()
+                    status, error = "error", str(e)
+                    logger.exception(f"Tarefa {spec.name} falhou")
+                finally:
+                    db.session.remove()
+
+                finished = datetime.utcnow()
+                with write_transaction() as conn:
+                    conn.execute(
+                        update(ScheduledJob)
+                        .where(and_(ScheduledJob.name == spec.name, ScheduledJob.locked_by == self.worker_id))
+                        .values(
+                            last_status=status,
+                            last_error=error,
+                            last_finished_at=finished,
+                            last_duration_ms=int((time.monotonic() - started) * 1000),
+                            run_count=ScheduledJob.run_count + 1,
+                            # "Executar agora" pedido durante a execução fica valendo
+                            next_run_at=case(
+                                (ScheduledJob.next_run_at > ScheduledJob.last_started_at, ScheduledJob.next_run_at),
+                                else_=finished + timedelta(seconds=spec.interval_seconds),
+                            ),
+                            locked_by=None,
+                            locked_until=None,
+                        )
+                    )
+        finally:
+            with self._running_lock:
+                self._running.discard(spec.name)
+
+    def run_now(self, name):
+        """Antecipa a próxima execução da tarefa para o próximo ciclo do agendador.
+
+        Se a tarefa estiver rodando, o pedido é preservado ao final da execução
+        (ela roda de novo no ciclo seguinte em vez de esperar o intervalo).
+        """
+        from models import ScheduledJob
+
+        with write_transaction() as conn:
+            conn.execute(
+                update(ScheduledJob).where(ScheduledJob.name == name).values(next_run_at=datetime.utcnow())
+            )
+
+
+scheduler = Scheduler()
@@ -0,0 +1,243 @@
+"""Vigia da sessão do WPPConnect: reconexão automática e mensagens retidas.
+
+A tarefa ``whatsapp_watchdog`` consulta o status direto no WPPConnect (sem o
+cache), registra as transições em ``whatsapp_session_state`` (visível por todos
+os workers) e, com a sessão caída, chama start-session com backoff exponencial.
+O WPPConnect reaproveita o token salvo da sessão, então a reconexão não pede
+QR Code; só o estado ``qrcode`` (token perdido) precisa de ação manual.
+
+Mensagens de texto enviadas com a sessão fora (ou com o WPPConnect
+inalcançável) ficam em ``whatsapp_outbox`` e são liberadas assim que a sessão
+volta; usuário e destino são cobrados ao reter a mensagem e a liberação segue
+o ritmo do limite da sessão.
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func, insert, select, update
+
+from app import db
+from database import write_transaction
+from models import WhatsAppOutboxMessage, WhatsAppSessionState
+from rate_limit import send_limiter
+from scheduler import scheduler
+from whatsapp_service import whatsapp_service
+
+logger = logging.getLogger(__name__)
+
+WATCHDOG_INTERVAL = int(os.environ.get("WHATSAPP_WATCHDOG_INTERVAL", 10))
+RECONNECT_BASE_SECONDS = int(os.environ.get("WHATSAPP_RECONNECT_BASE_SECONDS", 5))
+RECONNECT_MAX_SECONDS = int(os.environ.get("WHATSAPP_RECONNECT_MAX_SECONDS", 300))
+# Sessão "iniciando" por mais tempo que isso é tratada como caída
+STARTING_TIMEOUT_SECONDS = 120
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+# Mensagem reservada ("enviando") há mais que isso: o worker caiu no meio do envio
+UNCONFIRMED_AFTER_SECONDS = 600
+
+CONNECTED, STARTING, QRCODE, CLOSED, OFFLINE = "connected", "starting", "qrcode", "closed", "offline"
+RECONNECT_STATES = (CLOSED, OFFLINE)
+
+
+def session_state(status: Dict) -> str:
+    """Traduz a resposta do status-session do WPPConnect para um estado do vigia"""
+    if status.get("error"):
+        return OFFLINE
+    if whatsapp_service.status_is_connected(status):
+        return CONNECTED
+    value = str(status.get("status") or status.get("state") or "").upper()
+    if value in ("QRCODE", "NOTLOGGED", "UNPAIRED"):
+        return QRCODE
+    if value in ("INITIALIZING", "STARTING", "OPENING", "PAIRING"):
+        return STARTING
+    return CLOSED
+
+
+def _load_state() -> Optional[WhatsAppSessionState]:
+    return db.session.get(WhatsAppSessionState, whatsapp_service.session_name)
+
+
+def is_available() -> bool:
+    """Sessão utilizável para envio segundo a última verificação (sem verificação ainda: sim)"""
+    state = _load_state()
+    return state is None or state.state == CONNECTED
+
+
+def request_check() -> None:
+    """Antecipa a próxima execução do vigia (ex.: após uma falha de envio)"""
+    scheduler.run_now("whatsapp_watchdog")
+
+# ==================== ENVIO EM SEGUNDO PLANO ====================
+
+def claim_message(model, message_id: int) -> bool:
+    """Reserva a mensagem pendente ("enviando") antes do envio; falso se outro worker já a pegou.
+
+    Até o envio ser confirmado, ``sent_at`` guarda o horário da reserva.
+    """
+    with write_transaction() as conn:
+        claimed = conn.execute(
+            update(model).where(model.id == message_id, model.status == "pendente")
+            .values(status="enviando", sent_at=datetime.utcnow())
+        )
+    return claimed.rowcount == 1
+
+
+def finish_message(model, message_id: int, **values) -> None:
+    """Grava o resultado do envio logo após ele, uma mensagem por vez"""
+    with write_transaction() as conn:
+        conn.execute(update(model).where(model.id == message_id).values(**values))
+
+
+def expire_unconfirmed(model) -> int:
+    """Reservas antigas viram erro: a mensagem pode ter saído, então não é reenviada"""
+    cutoff = datetime.utcnow() - timedelta(seconds=UNCONFIRMED_AFTER_SECONDS)
+    with write_transaction() as conn:
+        expired = conn.execute(
+            update(model).where(model.status == "enviando", model.sent_at < cutoff)
+            .values(status="erro", sent_at=None, error="Envio interrompido sem confirmação")
+        )
+    if expired.rowcount:
+        logger.warning(f"{expired.rowcount} envios de {model.__tablename__} interrompidos sem confirmação")
+    return expired.rowcount
+
+# ==================== MENSAGENS RETIDAS ====================
+
+def hold_message(phone: str, message: str, user_id: Optional[int] = None) -> int:
+    """Guarda a mensagem para envio na reconexão; retorna o id na fila"""
+    with write_transaction() as conn:
+        result = conn.execute(insert(WhatsAppOutboxMessage).values(
+            phone=phone, message=message, status="pendente", attempts=0,
+            created_by=user_id, created_at=datetime.utcnow()
+        ))
+    logger.info(f"Mensagem para {phone} retida até a sessão do WhatsApp voltar")
+    return result.inserted_primary_key[0]
+
+
+def pending_count() -> int:
+    return db.session.scalar(
+        select(func.count(WhatsAppOutboxMessage.id)).where(WhatsAppOutboxMessage.status == "pendente")
+    )
+
+
+def release_outbox() -> int:
+    """Envia as mensagens retidas em ordem de chegada; para se o WPPConnect ficar inalcançável de novo
+
+    Usuário e destino já foram cobrados ao reter a mensagem; a liberação só consome
+    o bucket da sessão, então o ritmo fica no ``RATE_LIMIT_SESSION`` e o restante
+    espera os próximos ciclos. Cada mensagem é reservada antes do envio (um ciclo
+    que passe do lease não é reenviado por outro worker). Cada falha conta uma
+    tentativa e a mensagem vira ``erro`` em ``OUTBOX_MAX_ATTEMPTS``; sem
+    confirmação do WPPConnect vira ``erro`` na hora, pois reenviar poderia duplicá-la.
+    """
+    expire_unconfirmed(WhatsAppOutboxMessage)
+    pending = db.session.execute(
+        select(
+            WhatsAppOutboxMessage.id, WhatsAppOutboxMessage.phone,
+            WhatsAppOutboxMessage.message, WhatsAppOutboxMessage.attempts,
+        )
+        .where(WhatsAppOutboxMessage.status == "pendente")
+        .order_by(WhatsAppOutboxMessage.id)
+        .limit(OUTBOX_BATCH_SIZE)
+    ).all()
+    # O envio pelo WPPConnect não deve segurar uma transação aberta
+    db.session.rollback()
+
+    sent = 0
+    for message_id, phone, message, attempts in pending:
+        if not claim_message(WhatsAppOutboxMessage, message_id):
+            continue
+        if not send_limiter.acquire_session(whatsapp_service.session_name).allowed:
+            # Volta para a fila; as demais saem nos próximos ciclos
+            finish_message(WhatsAppOutboxMessage, message_id, status="pendente", sent_at=None)
+            break
+        result = whatsapp_service.send_text_message(phone, message)
+
+        attempts += 1
+        if not result.get("error") and result.get("success", True):
+            finish_message(WhatsAppOutboxMessage, message_id, status="enviada", sent_at=datetime.utcnow(),
+                           attempts=attempts, error=None)
+            sent += 1
+            continue
+        unconfirmed = result.get("error") and not (result.get("connection_error") or result.get("status_code"))
+        failed = unconfirmed or attempts >= OUTBOX_MAX_ATTEMPTS
+        finish_message(WhatsAppOutboxMessage, message_id, status="erro" if failed else "pendente", sent_at=None,
+                       attempts=attempts, error=result.get("error") or result.get("message") or "Erro ao enviar mensagem")
+        if result.get("connection_error"):
+            # A sessão caiu de novo: as demais esperam a próxima reconexão
+            logger.warning(f"Liberação de mensagens retidas interrompida: {result['error']}")
+            break
+
+    if sent:
+        logger.info(f"Mensagens retidas liberadas: {sent}")
+    return sent
+
+# ==================== VIGIA ====================
+
+def _backoff(failures: int) -> timedelta:
+    return timedelta(seconds=min(RECONNECT_BASE_SECONDS * 2 ** max(failures - 1, 0), RECONNECT_MAX_SECONDS))
+
+
+def check_session() -> str:
+    """Uma rodada do vigia: observa o estado, reconecta se for a hora e libera a fila"""
+    now = datetime.utcnow()
+    previous = _load_state()
+    previous_state = previous.state if previous else None
+    failures = previous.failures if previous else 0
+    next_attempt_at = previous.next_attempt_at if previous else None
+    changed_at = previous.changed_at if previous else now
+    db.session.rollback()
+
+    status = whatsapp_service.refresh_session_status()
+    state = session_state(status)
+    last_error = status.get("error")
+
+    stuck = state == STARTING and previous_state == STARTING and now - changed_at > timedelta(seconds=STARTING_TIMEOUT_SECONDS)
+    if (state in RECONNECT_STATES or stuck) and (next_attempt_at is None or next_attempt_at <= now):
+        logger.info(f"Reconectando a sessão {whatsapp_service.session_name} (tentativa {failures + 1})")
+        result = whatsapp_service.start_session()
+        started = session_state(result)
+        if started in (CONNECTED, STARTING, QRCODE):
+            state = started
+        if state != CONNECTED:
+            failures += 1
+            next_attempt_at = now + _backoff(failures)
+            last_error = result.get("error") or result.get("message") or last_error
+
+    if state == CONNECTED:
+        failures, next_attempt_at, last_error = 0, None, None
+    if state != previous_state:
+        changed_at = now
+        whatsapp_service.invalidate_cache()
+        log = logger.info if state == CONNECTED else logger.warning
+        log(f"Sessão {whatsapp_service.session_name}: {previous_state or 'desconhecido'} -> {state}")
+
+    values = {
+        "state": state, "changed_at": changed_at, "checked_at": now,
+        "failures": failures, "next_attempt_at": next_attempt_at, "last_error": last_error,
+    }
+    with write_transaction() as conn:
+        updated = conn.execute(
+            update(WhatsAppSessionState)
+            .where(WhatsAppSessionState.session_name == whatsapp_service.session_name)
+            .values(**values)
+        )
+        if updated.rowcount == 0:
+            conn.execute(insert(WhatsAppSessionState).values(session_name=whatsapp_service.session_name, **values))
+
+    if state == CONNECTED:
+        release_outbox()
+    return state
+
+
+def snapshot() -> Dict:
+    """Estado da sessão para a interface (sem o horário da última verificação, para não quebrar a ETag)"""
+    state = _load_state()
+    return {
+        "state": state.state if state else None,
+        "since": state.changed_at.isoformat() if state else None,
+        "failures": state.failures if state else 0,
+        "next_attempt_at": state.next_attempt_at.isoformat() if state and state.next_attempt_at else None,
+        "pending_messages": pending_count(),
+    }
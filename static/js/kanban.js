@@ -11,6 +11,7 @@ function initializeKanban() {
     columns.forEach(column => {
         new Sortable(column, {
             group: 'kanban-cards',
+            draggable: '.kanban-card',
             animation: 150,
             ghostClass: 'sortable-ghost',
             chosenClass: 'sortable-chosen',
@@ -19,6 +20,82 @@ function initializeKanban() {
                 handleCardMove(evt);
             }
         });
+        
+        // Load the next window of cards when scrolling near the bottom
+        column.addEventListener('scroll', function() {
+            if (column.scrollTop + column.clientHeight >= column.scrollHeight - 200) {
+                loadMoreCards(column);
+            }
+        });
+        
+        // The first window may not fill the column; keep loading until it scrolls
+        if (column.scrollHeight <= column.clientHeight) {
+            loadMoreCards(column);
+        }
+    });
+}
+
+function loadMoreCards(column) {
+    const cursor = column.getAttribute('data-next-cursor');
+    if (!cursor || column.dataset.loading === 'true') {
+        return;
+    }
+    // Server is shedding load (503 + Retry-After); keep the cursor and wait
+    if (Date.now() < parseInt(column.dataset.retryAt || '0')) {
+        return;
+    }
+    
+    const columnId = column.getAttribute('data-column-id');
+    column.dataset.loading = 'true';
+    
+    const loading = document.createElement('div');
+    loading.className = 'kanban-cards-loading';
+    loading.innerHTML = '<span class="spinner-border spinner-border-sm"></span>';
+    column.appendChild(loading);
+    
+    fetch(`/api/kanban/columns/${columnId}/cards?after=${encodeURIComponent(cursor)}`, {
+        headers: {
+            'X-Requested-With': 'XMLHttpRequest'
+        }
+    })
+    .then(response => {
+        if (response.status === 503) {
+            const retryAfter = parseInt(response.headers.get('Retry-After') || '15');
+            column.dataset.retryAt = Date.now() + retryAfter * 1000;
+            return null;
+        }
+        return response.json();
+    })
+    .then(data => {
+        if (!data) {
+            return;
+        }
+        const template = document.createElement('template');
+        template.innerHTML = data.html;
+        
+        // Cards moved while paginating may already be on the board
+        template.content.querySelectorAll('.kanban-card').forEach(card => {
+            const cardId = card.getAttribute('data-card-id');
+            if (!document.querySelector(`.kanban-card[data-card-id="${cardId}"]`)) {
+                column.insertBefore(card, loading);
+            }
+        });
+        
+        if (data.next_cursor) {
+            column.setAttribute('data-next-cursor', data.next_cursor);
+        } else {
+            column.removeAttribute('data-next-cursor');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+    })
+    .finally(() => {
+        loading.remove();
+        column.dataset.loading = 'false';
+        if (column.getAttribute('data-next-cursor') && column.scrollHeight <= column.clientHeight) {
+            loadMoreCards(column);
+        }
     });
 }
 
@@ -124,7 +201,7 @@ function handleCardMove(evt) {
     .then(data => {
         if (data.success) {
             // Update column badges
-            updateColumnBadges();
+            updateColumnBadges(evt.from, evt.to);
             showAlert('Cartão movido com sucesso!', 'success');
         } else {
             // Revert the move
@@ -144,14 +221,25 @@ function handleCardMove(evt) {
     });
 }
 
-function updateColumnBadges() {
+function updateColumnBadges(from, to) {
+    // Badges show the column total, not just the cards loaded in the window
+    if (from && to && from !== to) {
+        adjustColumnTotal(from, -1);
+        adjustColumnTotal(to, 1);
+    }
+    
     document.querySelectorAll('.kanban-column').forEach(column => {
         const badge = column.querySelector('.badge');
-        const cardCount = column.querySelectorAll('.kanban-card').length;
-        badge.textContent = cardCount;
+        badge.textContent = badge.getAttribute('data-total');
     });
 }
 
+function adjustColumnTotal(cards, delta) {
+    const badge = cards.closest('.kanban-column').querySelector('.badge');
+    const total = parseInt(badge.getAttribute('data-total') || '0') + delta;
+    badge.setAttribute('data-total', Math.max(total, 0));
+}
+
 function showFormErrors(errors) {
     // Clear previous errors
     document.querySelectorAll('.text-danger').forEach(el => el.remove());
@@ -1,6 +1,7 @@
 // WhatsApp interface JavaScript functionality
 let currentConversation = null;
 let messageRefreshInterval = null;
+let refreshPausedUntil = 0;
 
 document.addEventListener('DOMContentLoaded', function() {
     initializeWhatsApp();
@@ -272,11 +273,27 @@ function setupPhoneInputs() {
 }
 
 function refreshMessages() {
+    // Server asked us to back off (503 + Retry-After)
+    if (Date.now() < refreshPausedUntil) {
+        return;
+    }
     if (currentConversation) {
         // Silently refresh current conversation
-        fetch(`/api/whatsapp/messages?phone=${encodeURIComponent(currentConversation)}`)
-        .then(response => response.json())
+        fetch(`/api/whatsapp/messages?phone=${encodeURIComponent(currentConversation)}`, {
+            headers: { 'X-Poll': '1' }
+        })
+        .then(response => {
+            if (response.status === 503) {
+                const retryAfter = parseInt(response.headers.get('Retry-After') || '30');
+                refreshPausedUntil = Date.now() + retryAfter * 1000;
+                return null;
+            }
+            return response.json();
+        })
         .then(data => {
+            if (!data) {
+                return;
+            }
             const messagesContainer = document.getElementById('chat-messages');
             const currentScrollTop = messagesContainer.scrollTop;
             const currentScrollHeight = messagesContainer.scrollHeight;
@@ -0,0 +1,103 @@
+"""Carimbos de versão por tabela.
+
+Cada commit da sessão que alterou uma tabela monitorada incrementa a linha
+correspondente em ``data_versions`` logo depois, em uma transação própria e
+curta: a linha do carimbo não fica travada durante a transação de quem escreve
+(no Postgres isso serializaria todos os escritores naquela linha). Os carimbos
+são compartilhados por todos os workers (estão no banco) e servem de base para
+ETags e cache.
+
+Limitação conhecida: entre o commit dos dados e o incremento há uma janela
+curta em que leitores ainda veem o carimbo antigo; se o processo morrer nessa
+janela, caches e ETags daquela tabela só mudam na próxima escrita. Operações
+em massa com SQL direto chamam ``bump_versions(..., connection=conn)`` dentro
+da própria transação (uma vez por lote).
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import event, select, update
+
+from database import RoutingSession, write_transaction
+
+logger = logging.getLogger(__name__)
+
+TRACKED_TABLES = ("users", "clients", "kanban_columns", "kanban_cards")
+
+
+def init_versioning(db):
+    """Garante uma linha de versão para cada tabela monitorada"""
+    from models import DataVersion
+
+    existing = set(db.session.scalars(select(DataVersion.name)))
+    for name in TRACKED_TABLES:
+        if name not in existing:
+            db.session.add(DataVersion(name=name, version=0, updated_at=datetime.utcnow()))
+    db.session.commit()
+
+
+def _changed_tables(db_session):
+    tables = set()
+    for obj in list(db_session.new) + list(db_session.deleted):
+        tables.add(getattr(obj, "__tablename__", None))
+    for obj in db_session.dirty:
+        if db_session.is_modified(obj, include_collections=False):
+            tables.add(getattr(obj, "__tablename__", None))
+    return tables.intersection(TRACKED_TABLES)
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def collect_changed_tables(db_session, flush_context, instances):
+    db_session.info.setdefault("_changed_tables", set()).update(_changed_tables(db_session))
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def remember_changed_tables(db_session, flush_context):
+    tables = db_session.info.pop("_changed_tables", None)
+    if tables:
+        db_session.info.setdefault("_pending_bumps", set()).update(tables)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def bump_committed_tables(db_session):
+    tables = db_session.info.pop("_pending_bumps", None)
+    if tables:
+        with write_transaction() as conn:
+            bump_versions(*tables, connection=conn)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def discard_changed_tables(db_session):
+    db_session.info.pop("_pending_bumps", None)
+
+
+def bump_versions(*names, connection=None):
+    """Incrementa as versões das tabelas informadas.
+
+    Chamado automaticamente nos flushes do ORM; operações em massa que usam
+    UPDATE/DELETE direto devem chamá-lo explicitamente.
+    """
+    from app import db
+    from models import DataVersion
+
+    names = [name for name in names if name]
+    if not names:
+        return
+    statement = (
+        update(DataVersion)
+        .where(DataVersion.name.in_(names))
+        .values(version=DataVersion.version + 1, updated_at=datetime.utcnow())
+    )
+    (connection or db.session).execute(statement)
+
+
+def get_versions(*names):
+    """Retorna {tabela: (versão, atualizado_em)} em uma única consulta"""
+    from app import db
+    from models import DataVersion
+
+    rows = db.session.execute(
+        select(DataVersion.name, DataVersion.version, DataVersion.updated_at)
+        .where(DataVersion.name.in_(names))
+    )
+    return {name: (version, updated_at) for name, version, updated_at in rows}
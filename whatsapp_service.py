@@ -1,10 +1,57 @@
 import requests
+import urllib3
 import json
 import logging
 import os
-from typing import Dict, List, Optional, Any
+import uuid
+from typing import BinaryIO, Dict, List, Optional, Any
 from urllib.parse import urljoin
 
+from cache import cache
+
+# Leituras do WPPConnect mantidas no cache local de cada worker (TTL curto)
+CACHED_READS = ("status", "contacts", "chats", "health")
+
+# Tamanho dos blocos lidos/enviados no upload em streaming
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class FileTooLargeError(ValueError):
+    """Arquivo maior que o limite configurado para envio"""
+    
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Arquivo excede o limite de {max_bytes // (1024 * 1024)} MB")
+        self.max_bytes = max_bytes
+
+
+class _MultipartStream:
+    """Corpo multipart gerado sob demanda: cabeçalhos, blocos do arquivo e fechamento"""
+    
+    def __init__(self, prefix: bytes, fileobj: BinaryIO, suffix: bytes, max_bytes: int, length: Optional[int]):
+        self.prefix = prefix
+        self.fileobj = fileobj
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.length = length
+    
+    def __len__(self) -> int:
+        # Usado pelo requests para definir o Content-Length
+        return self.length or 0
+    
+    def __iter__(self):
+        yield self.prefix
+        sent = 0
+        while True:
+            chunk = self.fileobj.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            sent += len(chunk)
+            if sent > self.max_bytes:
+                raise FileTooLargeError(self.max_bytes)
+            yield chunk
+        yield self.suffix
+
+
 class WhatsAppService:
     """
     Serviço para integração com WPPConnect Server
@@ -20,6 +67,42 @@ class WhatsAppService:
             "Authorization": f"Bearer {self.secret_token}"
         }
         self.logger = logging.getLogger(__name__)
+        # Cache curto para consultas de leitura feitas por polling (status, contatos, conversas)
+        self.cache_ttl = int(os.environ.get("WPPCONNECT_CACHE_TTL", 5))
+        self.max_file_bytes = int(os.environ.get("WHATSAPP_MAX_FILE_MB", 16)) * 1024 * 1024
+    
+    def _cache_key(self, key: str) -> str:
+        return f"wpp:{self.session_name}:{key}"
+    
+    def _cached(self, key: str, loader, ttl: Optional[int] = None) -> Dict:
+        """Retorna o resultado do cache local ou chama o WPPConnect; erros ficam no máximo cache_ttl segundos.
+
+        Só o nível local: com TTL de segundos, gravar no nível compartilhado custaria mais que a consulta.
+        """
+        full_key = self._cache_key(key)
+        value = cache.get(full_key, local_only=True)
+        if value is not None:
+            return value
+        
+        value = loader()
+        ttl = self.cache_ttl if ttl is None else ttl
+        if isinstance(value, dict) and value.get("error"):
+            ttl = min(ttl, self.cache_ttl)
+        cache.set(full_key, value, ttl, local_only=True)
+        return value
+    
+    def invalidate_cache(self) -> None:
+        """Descarta o cache de leituras deste worker (ex.: após iniciar ou fechar a sessão); nos demais expira pelo TTL"""
+        cache.delete(*(self._cache_key(key) for key in CACHED_READS), local_only=True)
+    
+    @staticmethod
+    def _not_sent(error: requests.exceptions.ConnectionError) -> bool:
+        """Falha antes de a requisição chegar ao WPPConnect (conexão recusada, DNS, timeout de conexão)"""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = error.args[0] if error.args else None
+        reason = getattr(reason, "reason", reason)  # MaxRetryError do urllib3
+        return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
     
     def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
         """Faz requisições para a API do WPPConnect"""
@@ -40,6 +123,15 @@ class WhatsAppService:
             response.raise_for_status()
             return response.json()
             
+        except requests.exceptions.ConnectionError as e:
+            self.logger.error(f"Erro de conexão com {url}: {str(e)}")
+            if self._not_sent(e):
+                return {"error": str(e), "success": False, "connection_error": True}
+            # Conexão caiu depois do envio (ex.: RemoteDisconnected): o servidor pode ter processado
+            return {"error": str(e), "success": False}
+        except requests.exceptions.HTTPError as e:
+            self.logger.error(f"Erro na requisição para {url}: {str(e)}")
+            return {"error": str(e), "success": False, "status_code": e.response.status_code}
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Erro na requisição para {url}: {str(e)}")
             return {"error": str(e), "success": False}
@@ -50,27 +142,30 @@ class WhatsAppService:
     # ==================== GERENCIAMENTO DE SESSÃO ====================
     
     def start_session(self) -> Dict:
-        """Inicia uma nova sessão do WhatsApp"""
+        """Inicia a sessão do WhatsApp (uma tentativa; novas tentativas ficam com o session_watchdog)"""
         endpoint = f"/api/{self.session_name}/start-session"
         result = self._make_request("POST", endpoint)
-        
-        # Se o WPPConnect retornar erro interno, aguardar um momento e tentar novamente
-        if result.get("error") or result.get("status") == "CLOSED":
-            import time
-            time.sleep(2)  # Aguardar 2 segundos
-            result = self._make_request("POST", endpoint)
-        
+        self.invalidate_cache()
         return result
     
     def close_session(self) -> Dict:
         """Fecha a sessão atual do WhatsApp"""
         endpoint = f"/api/{self.session_name}/close-session"
-        return self._make_request("POST", endpoint)
+        result = self._make_request("POST", endpoint)
+        self.invalidate_cache()
+        return result
     
     def get_session_status(self) -> Dict:
         """Verifica o status da sessão atual"""
         endpoint = f"/api/{self.session_name}/status-session"
-        return self._make_request("GET", endpoint)
+        return self._cached("status", lambda: self._make_request("GET", endpoint))
+    
+    def refresh_session_status(self) -> Dict:
+        """Consulta o status direto no WPPConnect e atualiza o cache local"""
+        endpoint = f"/api/{self.session_name}/status-session"
+        status = self._make_request("GET", endpoint)
+        cache.set(self._cache_key("status"), status, self.cache_ttl, local_only=True)
+        return status
     
     def get_qr_code(self) -> Dict:
         """Obtém o QR Code para autenticação"""
@@ -95,8 +190,11 @@ class WhatsAppService:
     
     def is_connected(self) -> bool:
         """Verifica se o WhatsApp está conectado"""
-        status = self.get_session_status()
-        return status.get("status") == "open" or status.get("state") == "CONNECTED"
+        return self.status_is_connected(self.get_session_status())
+    
+    @staticmethod
+    def status_is_connected(status: Dict) -> bool:
+        return status.get("status") in ("open", "CONNECTED") or status.get("state") == "CONNECTED"
     
     # ==================== ENVIO DE MENSAGENS ====================
     
@@ -131,7 +229,7 @@ class WhatsAppService:
         return self._make_request("POST", endpoint, data)
     
     def send_file_base64(self, phone: str, base64_data: str, filename: str, caption: str = "") -> Dict:
-        """Envia um arquivo via base64"""
+        """Envia um arquivo via base64 (o arquivo inteiro fica em memória; para documentos use send_file_stream)"""
         endpoint = f"/api/{self.session_name}/send-file-base64"
         data = {
             "phone": self._format_phone(phone),
@@ -141,6 +239,72 @@ class WhatsAppService:
         }
         return self._make_request("POST", endpoint, data)
     
+    def send_file_stream(self, phone: str, fileobj: BinaryIO, filename: str, caption: str = "",
+                         content_type: Optional[str] = None, max_bytes: Optional[int] = None) -> Dict:
+        """Envia um arquivo por upload multipart em streaming (sem base64).
+        
+        O arquivo é lido em blocos de STREAM_CHUNK_SIZE e enviado direto ao WPPConnect,
+        então a memória usada por envio é constante, independente do tamanho do arquivo.
+        """
+        endpoint = f"/api/{self.session_name}/send-file"
+        url = urljoin(self.base_url, endpoint)
+        max_bytes = max_bytes or self.max_file_bytes
+        
+        size = self._stream_size(fileobj)
+        if size is not None and size > max_bytes:
+            return {"error": str(FileTooLargeError(max_bytes)), "success": False}
+        
+        boundary = uuid.uuid4().hex
+        fields = {
+            "phone": self._format_phone(phone),
+            "filename": filename,
+            "caption": caption
+        }
+        prefix = b"".join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+            for name, value in fields.items()
+        )
+        safe_filename = filename.replace('"', "'")
+        prefix += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{safe_filename}"\r\n'
+            f'Content-Type: {content_type or "application/octet-stream"}\r\n\r\n'
+        ).encode("utf-8")
+        suffix = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        
+        headers = {
+            "Authorization": self.headers["Authorization"],
+            "Content-Type": f"multipart/form-data; boundary={boundary}"
+        }
+        # Com tamanho conhecido o corpo sai com Content-Length; senão, em chunked encoding
+        length = len(prefix) + size + len(suffix) if size is not None else None
+        body = _MultipartStream(prefix, fileobj, suffix, max_bytes, length)
+        
+        try:
+            response = requests.post(url, headers=headers, data=body if length is not None else iter(body), timeout=120)
+            response.raise_for_status()
+            return response.json()
+        except FileTooLargeError as e:
+            self.logger.warning(f"Envio de {filename} interrompido: {e}")
+            return {"error": str(e), "success": False}
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Erro no envio em streaming para {url}: {str(e)}")
+            return {"error": str(e), "success": False}
+        except json.JSONDecodeError as e:
+            self.logger.error(f"Erro ao decodificar JSON da resposta: {str(e)}")
+            return {"error": "Resposta inválida do servidor", "success": False}
+    
+    @staticmethod
+    def _stream_size(fileobj: BinaryIO) -> Optional[int]:
+        """Tamanho restante do arquivo, se ele permitir seek (senão None e o envio é chunked)"""
+        try:
+            position = fileobj.tell()
+            fileobj.seek(0, os.SEEK_END)
+            size = fileobj.tell() - position
+            fileobj.seek(position)
+            return size
+        except (AttributeError, OSError, ValueError):
+            return None
+    
     def send_voice(self, phone: str, audio_path: str) -> Dict:
         """Envia um áudio/nota de voz"""
         endpoint = f"/api/{self.session_name}/send-voice"
@@ -231,12 +395,12 @@ class WhatsAppService:
     def get_all_contacts(self) -> Dict:
         """Obtém todos os contatos"""
         endpoint = f"/api/{self.session_name}/all-contacts"
-        return self._make_request("GET", endpoint)
+        return self._cached("contacts", lambda: self._make_request("GET", endpoint), ttl=60)
     
     def get_all_chats(self) -> Dict:
         """Obtém todas as conversas"""
         endpoint = f"/api/{self.session_name}/all-chats"
-        return self._make_request("GET", endpoint)
+        return self._cached("chats", lambda: self._make_request("GET", endpoint), ttl=15)
     
     def get_all_groups(self) -> Dict:
         """Obtém todos os grupos"""
@@ -271,6 +435,9 @@ class WhatsAppService:
     
     def health_check(self) -> Dict:
         """Verifica se o serviço WPPConnect está funcionando"""
+        return self._cached("health", self._health_check)
+    
+    def _health_check(self) -> Dict:
         try:
             response = requests.get(f"{self.base_url}/api/status", timeout=10)
             return response.json()